@@ -0,0 +1,95 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Benchmark hashing develop distributions.
+
+Writes a tree of 50,000 files of a few kilobytes, along with a few files
+large enough to be mapped into memory, and reports the time taken by
+_dir_hash to hash it, and by the serial algorithm it replaced, which
+must give the same hash.  Repeated runs are mostly served from the
+operating system's file cache; the reading ahead pays off most on slow
+or network file systems.
+
+Usage: python benchmarks/dir_hash.py [files]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import zc.buildout.buildout
+
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+
+def write_tree(dest, files):
+    for i in range(files):
+        directory = os.path.join(dest, 'd%d' % (i // 100), 's%d' % (i % 5))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        f = open(os.path.join(directory, 'f%d.py' % i), 'w')
+        f.write(('# file %d\n' % i) * (50 + i % 300))
+        f.close()
+    for i in range(4):
+        f = open(os.path.join(dest, 'large%d.dat' % i), 'w')
+        f.write(str(i) * (8 << 20))
+        f.close()
+
+def serial_hash(dir):
+    hash = md5()
+    for (dirpath, dirnames, filenames) in os.walk(dir):
+        dirnames[:] = [n for n in dirnames
+                       if n not in zc.buildout.buildout.ignore_directories]
+        filenames[:] = [f for f in filenames
+                        if (not (f.endswith('pyc') or f.endswith('pyo'))
+                            and os.path.exists(os.path.join(dirpath, f)))
+                        ]
+        hash.update(' '.join(dirnames))
+        hash.update(' '.join(filenames))
+        for name in filenames:
+            hash.update(open(os.path.join(dirpath, name)).read())
+    return hash.digest().encode('base64').strip()
+
+def timed(function, dir, repeat=3):
+    best = None
+    for _ in range(repeat):
+        zc.buildout.buildout._dir_hashes.clear()
+        start = time.time()
+        result = function(dir)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return result, best
+
+def main(args):
+    files = args and int(args[0]) or 50000
+    dest = tempfile.mkdtemp()
+    try:
+        write_tree(dest, files)
+        print 'Files: %d' % files
+        expected, serial = timed(serial_hash, dest)
+        print 'Serial:   %.3fs' % serial
+        result, threaded = timed(zc.buildout.buildout._dir_hash, dest)
+        print 'Threaded: %.3fs' % threaded
+        if result != expected:
+            print 'Hashes differ!'
+            sys.exit(1)
+    finally:
+        shutil.rmtree(dest)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
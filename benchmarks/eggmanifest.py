@@ -0,0 +1,81 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Benchmark finding the distributions in an eggs directory.
+
+Writes a directory of 3,000 eggs, half of them zipped, and reports the
+time taken to make a pkg_resources.Environment of it by scanning it, as
+installers do by default, and by using its manifest, as they do when the
+eggs-manifest buildout option is true.
+
+Usage: python benchmarks/eggmanifest.py [eggs]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+import pkg_resources
+import zc.buildout.eggmanifest
+import zc.buildout.rmtree
+
+def write_eggs(dest, eggs):
+    for i in range(eggs):
+        name = os.path.join(dest, 'project%d-1.0-py2.7.egg' % i)
+        pkg_info = 'Metadata-Version: 1.0\nName: project%d\nVersion: 1.0\n' % i
+        if i % 2:
+            zf = zipfile.ZipFile(name, 'w')
+            zf.writestr('EGG-INFO/PKG-INFO', pkg_info)
+            zf.close()
+        else:
+            os.makedirs(os.path.join(name, 'EGG-INFO'))
+            open(os.path.join(name, 'EGG-INFO', 'PKG-INFO'), 'w').write(
+                pkg_info)
+
+def timed(function, dest, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        env = function(dest)
+        elapsed = time.time() - start
+        if len(list(env)) != len(os.listdir(dest)) - 1:
+            print 'Distributions missing!'
+            sys.exit(1)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main(args):
+    eggs = args and int(args[0]) or 3000
+    dest = tempfile.mkdtemp()
+    try:
+        write_eggs(dest, eggs)
+        zc.buildout.eggmanifest.distributions(dest, create=True)
+        # Let the directory be old enough for its manifest to be used as
+        # it is.
+        past = time.time() - 10
+        os.utime(dest, (past, past))
+        zc.buildout.eggmanifest.distributions(dest)
+        print 'Eggs: %d' % eggs
+        print 'Scanning:       %.3fs' % timed(
+            lambda dest: pkg_resources.Environment([dest]), dest)
+        print 'Using manifest: %.3fs' % timed(
+            lambda dest: zc.buildout.eggmanifest.environment([dest], None),
+            dest)
+    finally:
+        zc.buildout.rmtree.rmtree(dest)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,76 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Benchmark recording installed parts in .installed.cfg.
+
+Installs 500 parts using the zc.buildout:debug recipe into a buildout
+that already has one part installed, so that .installed.cfg is updated
+after each part rather than created.
+Reports the time taken by the install run and the size of the resulting
+.installed.cfg.
+
+Usage: python benchmarks/installed.py [parts]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import zc.buildout.buildout
+
+def write_config(directory, parts):
+    f = open(os.path.join(directory, 'buildout.cfg'), 'w')
+    f.write('[buildout]\nparts = %s\n'
+            % ' '.join(['part%d' % i for i in range(parts)]))
+    for i in range(parts):
+        f.write('\n[part%d]\nrecipe = zc.buildout:debug\n' % i)
+        f.write(''.join(['option%d = value %d\n' % (j, j) for j in range(5)]))
+    f.close()
+
+def install(directory):
+    buildout = zc.buildout.buildout.Buildout(
+        os.path.join(directory, 'buildout.cfg'),
+        [('buildout', 'newest', 'false'), ('buildout', 'verbosity', '-20')],
+        user_defaults=False)
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.time()
+        buildout.install([])
+        return time.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+def run(parts):
+    directory = tempfile.mkdtemp()
+    try:
+        write_config(directory, 1)
+        install(directory)
+        write_config(directory, parts)
+        elapsed = install(directory)
+        size = os.path.getsize(os.path.join(directory, '.installed.cfg'))
+        return elapsed, size
+    finally:
+        shutil.rmtree(directory)
+
+def main(args):
+    parts = args and int(args[0]) or 500
+    elapsed, size = run(parts)
+    print 'Installed %d parts (%d bytes recorded): %.3fs' % (
+        parts, size, elapsed)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
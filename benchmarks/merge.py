@@ -0,0 +1,63 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Benchmark merging long options with += and -= through extends layers.
+
+Each of 20 layers extends the previous one and either adds 100 lines to
+an option that starts out with 2,000 lines or removes a few hundred lines
+from it.
+Reports the time taken to merge the layers, given the parsed files.
+
+Usage: python benchmarks/merge.py [layers [lines]]
+"""
+
+import sys
+import time
+
+import zc.buildout.buildout
+
+def make_layers(layers, lines):
+    annotate = zc.buildout.buildout._annotate
+    result = [annotate({'buildout': {
+        'eggs': '\n'.join(['egg%d' % i for i in range(lines)]),
+        }}, 'base.cfg')]
+    for layer in range(1, layers):
+        if layer % 2:
+            added = range(lines + layer * 100, lines + (layer + 1) * 100)
+            options = {'eggs +': '\n'.join(['egg%d' % i for i in added])}
+        else:
+            removed = range(layer, lines, 7)
+            options = {'eggs -': '\n'.join(['egg%d' % i for i in removed])}
+        result.append(annotate({'buildout': options}, 'layer%d.cfg' % layer))
+    return result
+
+def run(layers, lines, repeat=5):
+    best = None
+    for _ in range(repeat):
+        data = make_layers(layers, lines)
+        start = time.time()
+        result = data[0]
+        for layer in data[1:]:
+            result = zc.buildout.buildout._update(result, layer)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, len(result['buildout']['eggs'][0].split('\n'))
+
+def main(args):
+    layers, lines = [int(a) for a in args] + [20, 2000][len(args):]
+    elapsed, result = run(layers, lines)
+    print 'Merged %d layers into %d lines: %.3fs' % (layers, result, elapsed)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,83 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Benchmark the parse cache on a synthetic tree of extended files.
+
+Builds a buildout whose configuration extends 100 files (a chain of
+layers, each extending a few shared bases) and reports the time taken
+by Buildout.__init__ without a parse cache, with a cold cache and with
+a warm one.
+
+Usage: python benchmarks/parse_cache.py [files [sections [options]]]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import zc.buildout.buildout
+
+def make_tree(dest, files, sections, options):
+    for i in range(files):
+        f = open(os.path.join(dest, 'layer%d.cfg' % i), 'w')
+        f.write('[buildout]\n')
+        if i:
+            # Each layer extends its predecessor plus one of a few shared
+            # bases, so that the graph isn't just a straight line.
+            f.write('extends = layer%d.cfg base%d.cfg\n' % (i-1, i % 4))
+        for s in range(sections):
+            f.write('\n[section%d]\n' % s)
+            for o in range(options):
+                f.write('option%d = value %d %d %d\n' % (o, i, s, o))
+        f.close()
+    for i in range(4):
+        f = open(os.path.join(dest, 'base%d.cfg' % i), 'w')
+        f.write('[base%d]\nlocation = somewhere %d\n' % (i, i))
+        f.close()
+
+def run(dest, parse_cache, repeat=5):
+    options = [('buildout', 'log-level', 'WARNING')]
+    if parse_cache:
+        options.append(('buildout', 'parse-cache', parse_cache))
+    best = None
+    for _ in range(repeat):
+        here = os.getcwd()
+        start = time.time()
+        zc.buildout.buildout.Buildout(
+            os.path.join(dest, 'buildout.cfg'), options, user_defaults=False)
+        elapsed = time.time() - start
+        os.chdir(here)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main(args):
+    files, sections, options = ([int(a) for a in args] + [96, 10, 20][
+        len(args):])
+    dest = tempfile.mkdtemp()
+    try:
+        make_tree(dest, files, sections, options)
+        open(os.path.join(dest, 'buildout.cfg'), 'w').write(
+            '[buildout]\nparts =\nextends = layer%d.cfg\n' % (files - 1))
+        print 'Configuration files: %d' % (files + 5)
+        print 'No cache:   %.3fs' % run(dest, None)
+        cache = os.path.join(dest, 'parsed')
+        print 'Cold cache: %.3fs' % run(dest, cache, repeat=1)
+        print 'Warm cache: %.3fs' % run(dest, cache)
+    finally:
+        shutil.rmtree(dest)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
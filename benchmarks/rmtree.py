@@ -0,0 +1,66 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Benchmark removing large directory trees.
+
+Writes a tree of 100,000 small files, shaped like a directory of unzipped
+eggs, and reports the time taken to remove it by shutil.rmtree and by
+zc.buildout.rmtree.rmtree, which removes files in several threads.  The
+tree is written again before each removal.  The threads pay off most on
+slow or network file systems.
+
+Usage: python benchmarks/rmtree.py [files]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import zc.buildout.rmtree
+
+def write_tree(dest, files):
+    for i in range(files):
+        directory = os.path.join(dest, 'egg%d' % (i // 500),
+                                 'package', 'sub%d' % (i % 10))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        f = open(os.path.join(directory, 'module%d.py' % i), 'w')
+        f.write('# module %d\n' % i)
+        f.close()
+
+def timed(function, files, repeat=3):
+    best = None
+    for _ in range(repeat):
+        dest = tempfile.mkdtemp()
+        write_tree(dest, files)
+        start = time.time()
+        function(dest)
+        elapsed = time.time() - start
+        if os.path.exists(dest):
+            print 'Not removed!'
+            sys.exit(1)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def main(args):
+    files = args and int(args[0]) or 100000
+    print 'Files: %d' % files
+    print 'shutil.rmtree:             %.3fs' % timed(shutil.rmtree, files)
+    print 'zc.buildout.rmtree.rmtree: %.3fs' % timed(
+        zc.buildout.rmtree.rmtree, files)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,77 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Benchmark variable substitution over a synthetic configuration.
+
+Writes a configuration with 5,000 options spread over 100 sections, most
+of which refer to options of other sections, and reports the time taken
+to create the buildout and then to compute every section.
+
+Usage: python benchmarks/substitution.py [sections [options]]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import zc.buildout.buildout
+
+def write_config(path, sections, options):
+    f = open(path, 'w')
+    f.write('[buildout]\nparts =\nbase = /srv\n')
+    for s in range(sections):
+        f.write('\n[section%d]\n' % s)
+        for o in range(options):
+            if s and o % 5:
+                # Refer to the previous section, so that computing the last
+                # section pulls in long chains of references.
+                f.write('option%d = ${section%d:option%d}/%d ${:name}\n'
+                        % (o, s - 1, o, s))
+            else:
+                f.write('option%d = ${buildout:base}/%d/%d\n' % (o, s, o))
+        f.write('name = section%d\n' % s)
+    f.close()
+
+def run(path, repeat=3):
+    best = None
+    for _ in range(repeat):
+        here = os.getcwd()
+        start = time.time()
+        buildout = zc.buildout.buildout.Buildout(
+            path, [('buildout', 'log-level', 'WARNING')], user_defaults=False)
+        loaded = time.time()
+        for name in buildout:
+            buildout[name]
+        times = loaded - start, time.time() - loaded
+        os.chdir(here)
+        if best is None or sum(times) < sum(best):
+            best = times
+    return best
+
+def main(args):
+    sections, options = [int(a) for a in args] + [100, 50][len(args):]
+    dest = tempfile.mkdtemp()
+    try:
+        path = os.path.join(dest, 'buildout.cfg')
+        write_config(path, sections, options)
+        print 'Options: %d' % (sections * (options + 1))
+        load, substitution = run(path)
+        print 'Loading:      %.3fs' % load
+        print 'Substitution: %.3fs' % substitution
+    finally:
+        shutil.rmtree(dest)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
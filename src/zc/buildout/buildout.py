@@ -22,23 +22,32 @@ except ImportError:
     from md5 import md5
 
 import ConfigParser
-import copy
 import distutils.errors
+import filecmp
+import fnmatch
 import glob
 import itertools
 import logging
+import marshal
 import os
 import pkg_resources
+import Queue
 import re
 import shutil
+import stat
 import sys
 import tempfile
+import threading
+import time
 import UserDict
 import warnings
 import subprocess
 import zc.buildout
 import zc.buildout.download
 import zc.buildout.easy_install
+import zc.buildout.eggmanifest
+import zc.buildout.filehash
+import zc.buildout.trash
 
 
 realpath = zc.buildout.easy_install.realpath
@@ -143,13 +152,19 @@ _buildout_default_options = _annotate_section({
 
 class Buildout(UserDict.DictMixin):
 
+    # Where directories are moved to be removed in the background, if
+    # anywhere (see install).
+    _trash = None
+
     def __init__(self, config_file, cloptions,
                  user_defaults=True, windows_restart=False,
-                 command=None, args=()):
+                 command=None, args=(), force=False):
 
         __doing__ = 'Initializing.'
 
+        self._started = _timer()
         self.__windows_restart = windows_restart
+        self._force = force
 
         # default options
         data = dict(buildout=_buildout_default_options.copy())
@@ -188,24 +203,62 @@ class Buildout(UserDict.DictMixin):
             )
         override = cloptions.get('buildout', {}).copy()
 
-        # load user defaults, which override defaults
+        user_config = None
         if user_defaults:
             user_config = os.path.join(os.path.expanduser('~'),
                                        '.buildout', 'default.cfg')
-            if os.path.exists(user_config):
-                _update(data, _open(os.path.dirname(user_config), user_config,
-                                    [], data['buildout'].copy(), override,
-                                    set()))
 
-        # load configuration files
-        if config_file:
-            _update(data, _open(os.path.dirname(config_file), config_file, [],
-                                data['buildout'].copy(), override, set()))
+        # Use the compiled configuration, if any, unless we're asked to
+        # compile it again.  Command-line options aren't compiled in, so
+        # they're applied in either case.
+        snapshot_key = (_snapshot_format, config_file, user_config,
+                        sys.executable)
+        snapshot = None
+        if config_file and not _isurl(config_file) and command != 'compile':
+            snapshot = _load_snapshot(config_file, snapshot_key)
+        self._snapshot = None
+
+        # Files read while loading the user defaults and the configuration
+        # files, with the number of times each was used (see _open).
+        opened = [{}, {}]
+
+        if snapshot is not None:
+            data = snapshot
+        else:
+            # load user defaults, which override defaults
+            if user_config and os.path.exists(user_config):
+                _update(data, _open(os.path.dirname(user_config),
+                                    user_config, [], data['buildout'].copy(),
+                                    override, opened[0]))
+
+            # load configuration files
+            if config_file:
+                _update(data, _open(os.path.dirname(config_file), config_file,
+                                    [], data['buildout'].copy(), override,
+                                    opened[1]))
+
+            if command == 'compile':
+                inputs = [os.path.abspath(__file__)]
+                if user_config:
+                    inputs.append(user_config)
+                for files in opened:
+                    inputs.extend(files)
+                if not [f for f in inputs if _isurl(f)]:
+                    # Command-line options are merged into data below.
+                    self._snapshot = (
+                        snapshot_key, _file_stats(inputs),
+                        dict([(section, options.copy())
+                              for (section, options) in data.items()]))
 
         # apply command-line options
         _update(data, cloptions)
 
-        self._annotated = copy.deepcopy(data)
+        # The raw data is made from the annotated data in place, which
+        # keeps the order in which the section dictionaries report their
+        # options.  The annotations just need new section dictionaries,
+        # as the annotated values themselves are tuples.
+        self._annotated = dict([(name, section.copy())
+                                for (name, section) in data.items()])
         self._raw = _unannotate(data)
         self._data = {}
         self._parts = []
@@ -275,6 +328,17 @@ class Buildout(UserDict.DictMixin):
 
         self._setup_logging()
 
+        if snapshot is not None:
+            self._logger.debug("Using compiled configuration %s.",
+                               _snapshot_path(config_file))
+
+        reused = sum([max(uses - 1, 0) for files in opened
+                      for (_, uses) in files.values()])
+        if reused:
+            self._logger.debug(
+                "Configuration files were extended more than once; "
+                "avoided parsing them %d more times.", reused)
+
         versions = options.get('versions')
         if versions:
             zc.buildout.easy_install.default_versions(dict(self[versions]))
@@ -295,6 +359,9 @@ class Buildout(UserDict.DictMixin):
         zc.buildout.easy_install.install_from_cache(
             options.get_bool('install-from-cache'))
         zc.buildout.easy_install.always_unzip(options.get_bool('unzip'))
+        zc.buildout.easy_install.use_eggs_manifest(
+            _convert_bool('eggs-manifest',
+                          options.get('eggs-manifest', 'false')))
         allowed_eggs = tuple(name.strip() for name in options[
             'allowed-eggs-from-site-packages'].split('\n'))
         self.include_site_packages = options.get_bool('include-site-packages')
@@ -327,12 +394,14 @@ class Buildout(UserDict.DictMixin):
         for name in _buildout_default_options:
             options[name]
 
-        # Do the same for extends-cache which is not among the defaults but
-        # wasn't recognized as having been used since it was used before
-        # tracking was turned on.
+        # Do the same for extends-cache and parse-cache which are not among
+        # the defaults but weren't recognized as having been used since they
+        # were used before tracking was turned on.
         options.get('extends-cache')
+        options.get('parse-cache')
 
         os.chdir(options['directory'])
+        self._loaded = _timer()
 
     def _buildout_path(self, name):
         if '${' in name:
@@ -456,7 +525,13 @@ class Buildout(UserDict.DictMixin):
     def install(self, install_args):
         __doing__ = 'Installing.'
 
-        self._load_extensions()
+        self._record_timing(None, 'load', self._started, self._loaded)
+        if self['buildout'].get('extensions'):
+            start = _timer()
+            self._load_extensions()
+            self._record_timing(None, 'extensions', start, _timer())
+        else:
+            self._load_extensions()
         self._setup_directories()
 
         # Add develop-eggs directory to path so that it gets searched
@@ -466,6 +541,45 @@ class Buildout(UserDict.DictMixin):
         # Check for updates. This could cause the process to be restarted.
         self._maybe_upgrade()
 
+        parallel_parts = self['buildout'].get('parallel-parts') or '1'
+        try:
+            parallel_parts = int(parallel_parts)
+            if parallel_parts < 1:
+                raise ValueError(parallel_parts)
+        except ValueError:
+            raise zc.buildout.UserError(
+                "Invalid value for parallel-parts option: %s"
+                % self['buildout']['parallel-parts'])
+
+        # If nothing changed since the last full run, there's nothing to
+        # do.  In newest mode, we always look for new distributions.
+        fingerprint_path = self._fingerprint_path()
+        if fingerprint_path and not install_args:
+            config = self._config_fingerprint()
+            if not (self.newest or self._force):
+                fingerprint = self._install_fingerprint(config)
+                try:
+                    last = open(fingerprint_path).read()
+                except IOError:
+                    last = None
+                if fingerprint == last and self._installed_files_exist():
+                    self._logger.info(
+                        "Nothing changed since the last run; nothing to do.")
+                    self._unload_extensions()
+                    return
+        if fingerprint_path and os.path.exists(fingerprint_path):
+            os.remove(fingerprint_path)
+
+        # Uninstalled directories can be moved out of the way and removed
+        # while the run goes on.
+        if _convert_bool('deferred-removal',
+                         self['buildout'].get('deferred-removal', 'false')):
+            self._trash = zc.buildout.trash.Trash(os.path.join(
+                self['buildout']['parts-directory'], '.trash'))
+
+        manifest_path, manifest_hash = self._manifest_settings()
+        timing_path = self._timing_history_path()
+
         # load installed data
         (installed_part_options, installed_exists
          )= self._read_installed_part_options()
@@ -477,7 +591,10 @@ class Buildout(UserDict.DictMixin):
             )
 
         # Build develop eggs
+        start = _timer()
         installed_develop_eggs = self._develop()
+        if self['buildout'].get('develop'):
+            self._record_timing(None, 'develop', start, _timer())
         installed_part_options['buildout']['installed_develop_eggs'
                                            ] = installed_develop_eggs
 
@@ -518,6 +635,119 @@ class Buildout(UserDict.DictMixin):
 
         # uninstall parts that are no-longer used or whose configs
         # have changed
+        self._staged_locations = {}
+        for part, reason in self._parts_to_uninstall(
+            install_parts, installed_parts, installed_part_options,
+            uninstall_missing):
+            location = None
+            if part in install_parts:
+                location = self._staged_location(part, installed_part_options)
+            if location:
+                self._staged_locations[part] = location
+            self._uninstall_part(part, installed_part_options, location)
+            installed_parts = [p for p in installed_parts if p != part]
+
+            if installed_exists:
+                self._update_installed(parts=' '.join(installed_parts))
+
+        # Check for unused buildout options:
+        _check_for_unused_options_in_section(self, 'buildout')
+
+        # install new parts
+        if parallel_parts > 1:
+            (installed_parts, installed_exists, failure
+             ) = self._install_parts_in_parallel(
+                install_parts, parallel_parts,
+                installed_parts, installed_part_options, installed_exists)
+            if failure is not None:
+                # Report the failure as if the part was installed here.
+                __doing__, exc_info = failure
+                _reraise(exc_info)
+        else:
+            for part in install_parts:
+                signature = self[part].pop('__buildout_signature__')
+                saved_options = self[part].copy()
+                update = part in installed_parts
+                if update:
+                    __doing__ = 'Updating %s.', part
+                else:
+                    __doing__ = 'Installing %s.', part
+                self._logger.info(*__doing__)
+
+                try:
+                    installed_files = self._call_part_recipe(part, update)
+                except:
+                    if update:
+                        self._part_update_failed(
+                            part, installed_parts, installed_part_options,
+                            installed_exists)
+                    raise
+
+                installed_parts, installed_exists = self._save_installed_part(
+                    part, update, signature, saved_options, installed_files,
+                    installed_parts, installed_part_options, installed_exists)
+
+        if installed_develop_eggs:
+            if not installed_exists:
+                self._save_installed_options(installed_part_options)
+        elif (not installed_parts) and installed_exists:
+            os.remove(self['buildout']['installed'])
+
+        # Updates were appended to the installed-parts database as we
+        # went, so write it out again without the superseded sections.
+        self._compact_installed()
+        if manifest_path:
+            self._compact_manifests(manifest_path, installed_parts)
+
+        if timing_path:
+            _compact_timings(timing_path)
+
+        # Wait for the uninstalled directories to be removed.  If the run
+        # fails, whatever is left is removed by the next one.
+        if self._trash is not None:
+            self._trash.close()
+            self._trash = None
+
+        # Save the meta data the recipes read from eggs, for example to
+        # generate scripts (see the eggs-manifest option).
+        zc.buildout.eggmanifest.save_metadata()
+
+        if fingerprint_path and not install_args:
+            f = open(fingerprint_path, 'w')
+            try:
+                f.write(self._install_fingerprint(config))
+            finally:
+                f.close()
+
+        self._unload_extensions()
+
+    def _parts_to_uninstall(self, install_parts, installed_parts,
+                            installed_part_options, uninstall_missing):
+        """Decide which installed parts to uninstall before installing.
+
+        Parts are uninstalled if their options, including their recipe
+        signatures, changed, if some of the files they installed are
+        missing or, if uninstall_missing is true, if they aren't to be
+        installed anymore.  Returns a list of the parts, in the order in
+        which to uninstall them, with the reasons for doing so.
+        """
+        # Look for the files of the parts to install that are installed
+        # already all at once, as that's cheaper than one at a time on
+        # slow file systems.
+        installed_paths = []
+        for part in installed_parts:
+            if part in install_parts:
+                installed_files = installed_part_options[part][
+                    '__buildout_installed__']
+                if installed_files:
+                    installed_paths.extend([
+                        self._buildout_path(f)
+                        for f in installed_files.split('\n')])
+        path_exists = dict(zip(
+            installed_paths,
+            _map_in_threads(os.path.exists, installed_paths, stat_threads)))
+
+        result = []
         for part in reversed(installed_parts):
             if part in install_parts:
                 old_options = installed_part_options[part].copy()
@@ -530,10 +760,18 @@ class Buildout(UserDict.DictMixin):
                     if not installed_files:
                         continue
                     for f in installed_files.split('\n'):
-                        if not os.path.exists(self._buildout_path(f)):
+                        if not path_exists[self._buildout_path(f)]:
                             break
                     else:
                         continue
+                    reason = 'installed files are missing'
+                elif [k for k in old_options
+                      if k != '__buildout_signature__'
+                      and old_options[k] != new_options.get(k)
+                      ] or [k for k in new_options if k not in old_options]:
+                    reason = 'options changed'
+                else:
+                    reason = 'recipe changed'
 
                 # output debugging info
                 if self._logger.getEffectiveLevel() < logging.DEBUG:
@@ -553,105 +791,378 @@ class Buildout(UserDict.DictMixin):
 
             elif not uninstall_missing:
                 continue
+            else:
+                reason = 'no longer a part'
 
-            self._uninstall_part(part, installed_part_options)
-            installed_parts = [p for p in installed_parts if p != part]
+            result.append((part, reason))
+        return result
 
-            if installed_exists:
-                self._update_installed(parts=' '.join(installed_parts))
+    def _call_part_recipe(self, part, update):
+        """Call the install or update method of the recipe of a part.
 
-        # Check for unused buildout options:
-        _check_for_unused_options_in_section(self, 'buildout')
+        Returns a list of the paths installed, or None if the update
+        method returned None.
+        """
+        recipe = self[part].recipe
+        action = update and 'update' or 'install'
+        start = _timer()
+        if update:
+            try:
+                update = recipe.update
+            except AttributeError:
+                update = recipe.install
+                self._logger.warning(
+                    "The recipe for %s doesn't define an update "
+                    "method. Using its install method.",
+                    part)
+
+            installed_files = self[part]._call(update)
+            end = _timer()
+            if installed_files is None:
+                self._record_timing(part, action, start, end)
+                return None
+        else:
+            location = self._staged_locations.pop(part, None)
+            if location:
+                installed_files = self._install_staged(part, location)
+            else:
+                installed_files = self[part]._call(recipe.install)
+            end = _timer()
+            if installed_files is None:
+                self._logger.warning(
+                    "The %s install returned None.  A path or "
+                    "iterable of paths should be returned.",
+                    part)
+                installed_files = []
 
-        # install new parts
-        for part in install_parts:
-            signature = self[part].pop('__buildout_signature__')
-            saved_options = self[part].copy()
-            recipe = self[part].recipe
-            if part in installed_parts: # update
-                need_to_save_installed = False
-                __doing__ = 'Updating %s.', part
-                self._logger.info(*__doing__)
-                old_options = installed_part_options[part]
-                old_installed_files = old_options['__buildout_installed__']
+        if isinstance(installed_files, str):
+            installed_files = [installed_files]
+        else:
+            installed_files = list(installed_files)
+        self._record_timing(part, action, start, end, installed_files)
+        return installed_files
+
+    def _part_update_failed(self, part, installed_parts,
+                            installed_part_options, installed_exists):
+        installed_parts.remove(part)
+        self._uninstall(installed_part_options[part]['__buildout_installed__'])
+        if installed_exists:
+            self._update_installed(parts=' '.join(installed_parts))
 
-                try:
-                    update = recipe.update
-                except AttributeError:
-                    update = recipe.install
-                    self._logger.warning(
-                        "The recipe for %s doesn't define an update "
-                        "method. Using its install method.",
-                        part)
+    def _save_installed_part(self, part, update, signature, saved_options,
+                             installed_files, installed_parts,
+                             installed_part_options, installed_exists):
+        """Record a part that was just installed or updated.
 
-                try:
-                    installed_files = self[part]._call(update)
-                except:
-                    installed_parts.remove(part)
-                    self._uninstall(old_installed_files)
-                    if installed_exists:
-                        self._update_installed(
-                            parts=' '.join(installed_parts))
-                    raise
+        Returns the new list of installed parts and whether the installed
+        parts database exists.
+        """
+        if update:
+            need_to_save_installed = False
+            old_installed_files = installed_part_options[part][
+                '__buildout_installed__'].split('\n')
+            if installed_files is None:
+                installed_files = old_installed_files
+            else:
+                need_to_save_installed = [
+                    p for p in installed_files
+                    if p not in old_installed_files]
 
-                old_installed_files = old_installed_files.split('\n')
-                if installed_files is None:
-                    installed_files = old_installed_files
-                else:
-                    if isinstance(installed_files, str):
-                        installed_files = [installed_files]
-                    else:
-                        installed_files = list(installed_files)
+                if need_to_save_installed:
+                    installed_files = (old_installed_files
+                                       + need_to_save_installed)
+        else:
+            need_to_save_installed = True
 
-                    need_to_save_installed = [
-                        p for p in installed_files
-                        if p not in old_installed_files]
+        installed_part_options[part] = saved_options
+        saved_options['__buildout_installed__'
+                      ] = '\n'.join(installed_files)
+        saved_options['__buildout_signature__'] = signature
 
-                    if need_to_save_installed:
-                        installed_files = (old_installed_files
-                                           + need_to_save_installed)
+        installed_parts = [p for p in installed_parts if p != part]
+        installed_parts.append(part)
+        _check_for_unused_options_in_section(self, part)
 
-            else: # install
-                need_to_save_installed = True
-                __doing__ = 'Installing %s.', part
-                self._logger.info(*__doing__)
-                installed_files = self[part]._call(recipe.install)
-                if installed_files is None:
-                    self._logger.warning(
-                        "The %s install returned None.  A path or "
-                        "iterable of paths should be returned.",
-                        part)
-                    installed_files = ()
-                elif isinstance(installed_files, str):
-                    installed_files = [installed_files]
+        if need_to_save_installed:
+            installed_part_options['buildout']['parts'] = (
+                ' '.join(installed_parts))
+            if installed_exists:
+                self._update_installed_part(
+                    part, saved_options,
+                    parts=installed_part_options['buildout']['parts'])
+            else:
+                self._save_installed_options(installed_part_options)
+            installed_exists = True
+        else:
+            assert installed_exists  # nothing to tell the user here
+            self._update_installed(parts=' '.join(installed_parts))
+
+        manifest_path, manifest_hash = self._manifest_settings()
+        if manifest_path:
+            manifest = _manifest([self._buildout_path(f)
+                                  for f in installed_files if f],
+                                 manifest_hash)
+            f = open(manifest_path, 'ab')
+            try:
+                marshal.dump((part, _options_key(saved_options), manifest), f)
+            finally:
+                f.close()
+
+        return installed_parts, installed_exists
+
+    def _install_parts_in_parallel(self, install_parts, workers,
+                                   installed_parts, installed_part_options,
+                                   installed_exists):
+        """Install or update parts in up to workers threads at a time.
+
+        A part is started once the parts before it that it depends on are
+        done.  The working directory, environment and sys.path are shared
+        by the threads, so only parts that are parallel-safe (see
+        _parallel_safe) are installed along with other parts.  Other parts
+        are installed while no other part is.  Parts are recorded as they
+        finish.  After a failure, no more parts are started, but the ones
+        running are waited for.
+
+        Returns the new list of installed parts, whether the installed
+        parts database exists, and the description and exception info of
+        the first failure, if any.
+        """
+        dependencies = self._part_dependencies(install_parts)
+        results = Queue.Queue()
+        pending = list(install_parts)
+        running = {}
+        exclusive = False
+        done = set()
+        failure = None
+
+        while pending or running:
+            for part in pending[:]:
+                if (failure is not None or exclusive
+                    or len(running) >= workers):
+                    break
+                if dependencies[part] - done:
+                    continue
+                if not self._parallel_safe(part):
+                    if running:
+                        # Wait for the running parts to be done, rather
+                        # than starting parts after this one.
+                        break
+                    exclusive = True
+                pending.remove(part)
+                signature = self[part].pop('__buildout_signature__')
+                saved_options = self[part].copy()
+                update = part in installed_parts
+                if update:
+                    doing = 'Updating %s.', part
                 else:
-                    installed_files = list(installed_files)
+                    doing = 'Installing %s.', part
+                self._logger.info(*doing)
+                running[part] = update, signature, saved_options, doing
+                threading.Thread(target=self._run_part_recipe,
+                                 args=(part, update, results)).start()
+
+            if not running:
+                break
+
+            part, installed_files, exc_info = results.get()
+            update, signature, saved_options, doing = running.pop(part)
+            exclusive = False
+            if exc_info is None:
+                done.add(part)
+                installed_parts, installed_exists = self._save_installed_part(
+                    part, update, signature, saved_options, installed_files,
+                    installed_parts, installed_part_options,
+                    installed_exists)
+            else:
+                if update:
+                    self._part_update_failed(
+                        part, installed_parts, installed_part_options,
+                        installed_exists)
+                if failure is None:
+                    failure = doing, exc_info
+
+        return installed_parts, installed_exists, failure
+
+    def _parallel_safe(self, part):
+        """Can the part be installed while other parts are?
+
+        Parts are parallel-safe if their parallel-safe option is true, or,
+        if they don't have the option, if their recipe has a true
+        parallel_safe attribute.  Such recipes mustn't change the working
+        directory, the environment, sys.path or other state shared by the
+        buildout process.
+        """
+        options = self[part]
+        safe = options.get('parallel-safe')
+        if safe is None:
+            return bool(getattr(options.recipe, 'parallel_safe', False))
+        return _convert_bool('parallel-safe', safe)
 
-            installed_part_options[part] = saved_options
-            saved_options['__buildout_installed__'
-                          ] = '\n'.join(installed_files)
-            saved_options['__buildout_signature__'] = signature
+    def _run_part_recipe(self, part, update, results):
+        try:
+            installed_files = self._call_part_recipe(part, update)
+        except:
+            results.put((part, None, sys.exc_info()))
+        else:
+            results.put((part, installed_files, None))
 
-            installed_parts = [p for p in installed_parts if p != part]
-            installed_parts.append(part)
-            _check_for_unused_options_in_section(self, part)
+    def _part_dependencies(self, parts):
+        """Find the parts each of the given parts has to be installed after.
 
-            if need_to_save_installed:
-                installed_part_options['buildout']['parts'] = (
-                    ' '.join(installed_parts))
-                self._save_installed_options(installed_part_options)
-                installed_exists = True
-            else:
-                assert installed_exists  # nothing to tell the user here
-                self._update_installed(parts=' '.join(installed_parts))
+        A part depends on the parts it refers to in substitutions, directly
+        or through other sections, and on those named in its depends-on
+        option.  Parts only depend on parts before them in the given order,
+        which already puts the parts a part refers to before it.
+        """
+        references = {}
+        def referenced(section):
+            if section not in references:
+                references[section] = self[section]._references()
+            return references[section]
+
+        result = {}
+        before = set()
+        for part in parts:
+            dependencies = set()
+            seen = set([part])
+            todo = list(referenced(part))
+            todo.extend(self[part].get('depends-on', '').split())
+            while todo:
+                section = todo.pop()
+                if section in seen:
+                    continue
+                seen.add(section)
+                if section in before:
+                    dependencies.add(section)
+                elif section in self._raw and section not in parts:
+                    todo.extend(referenced(section))
+            result[part] = dependencies
+            before.add(part)
+        return result
 
-        if installed_develop_eggs:
-            if not installed_exists:
-                self._save_installed_options(installed_part_options)
-        elif (not installed_parts) and installed_exists:
-            os.remove(self['buildout']['installed'])
+    def _fingerprint_path(self):
+        options = self['buildout']
+        path = options.get('installed-fingerprint')
+        if path and options['installed']:
+            return os.path.join(options['directory'], path)
+
+    def _timing_history_path(self):
+        path = self['buildout'].get('timing-history')
+        if path:
+            return os.path.join(self['buildout']['directory'], path)
+
+    def _record_timing(self, part, action, start, end, paths=None):
+        # Record the wall and CPU times between the given start and end
+        # (see _timer) and the number of files in the given paths.  Parts
+        # may be installed in several threads at once, each appending its
+        # records (see _read_timings).
+        path = self._timing_history_path()
+        if not path:
+            return
+        stats = dict(time=start[0], wall=end[0] - start[0],
+                     cpu=end[1] - start[1])
+        if paths is not None:
+            stats['files'] = _count_files([self._buildout_path(p)
+                                           for p in paths])
+        _timing_lock.acquire()
+        try:
+            f = open(path, 'ab')
+            try:
+                marshal.dump((part, action, stats), f)
+            finally:
+                f.close()
+        finally:
+            _timing_lock.release()
 
-        self._unload_extensions()
+    def _manifest_settings(self):
+        options = self['buildout']
+        path = options.get('installed-manifest')
+        hash = _convert_bool('installed-manifest-hash',
+                             options.get('installed-manifest-hash', 'false'))
+        if path:
+            path = os.path.join(options['directory'], path)
+        return path, hash
+
+    def _compact_manifests(self, path, installed_parts):
+        # Drop the manifests of parts that aren't installed anymore and
+        # the ones superseded by later records.
+        manifests, records = _read_manifests(path)
+        if not installed_parts:
+            if os.path.exists(path):
+                os.remove(path)
+        elif records > len(installed_parts):
+            f = open(path, 'wb')
+            try:
+                for part in installed_parts:
+                    if part in manifests:
+                        key, manifest = manifests[part]
+                        marshal.dump((part, key, manifest), f)
+            finally:
+                f.close()
+
+    def _config_fingerprint(self):
+        # Recipes may change their options, so this has to be taken
+        # before they're loaded.
+        raw = self._raw.items()
+        raw.sort()
+        result = []
+        for (section, options) in raw:
+            options = options.items()
+            options.sort()
+            if section == 'buildout':
+                options = [(option, value) for (option, value) in options
+                           if option not in _unfingerprinted_options]
+            result.append((section, options))
+        return repr(result)
+
+    def _install_fingerprint(self, config):
+        """Fingerprint what a full install run depends on.
+
+        That's the configuration (as returned by _config_fingerprint), the
+        installed-parts database, the develop sources and the contents of
+        the eggs directories.  Files are compared by size and modification
+        time, like the parse cache does.
+        """
+        options = self['buildout']
+        ignore = self._signature_ignore()
+        state = [_file_stats([options['installed']])]
+        for setup in (options.get('develop') or '').split():
+            files = glob.glob(self._buildout_path(setup))
+            files.sort()
+            for path in files:
+                if not os.path.isdir(path):
+                    path = os.path.dirname(path)
+                state.append(_dir_stats(path, ignore))
+        for name in ('eggs-directory', 'develop-eggs-directory'):
+            directory = options[name]
+            if os.path.isdir(directory):
+                names = os.listdir(directory)
+                names.sort()
+                state.append(_file_stats([os.path.join(directory, name)
+                                          for name in names]))
+        return md5(config + repr(state)).hexdigest()
+
+    def _installed_files_exist(self):
+        """Are all of the files installed by the installed parts there?
+
+        Files may be removed without changing anything the install
+        fingerprint covers, and parts are installed again if their files
+        are missing.  The files are looked for all at once, as that's
+        cheaper than one at a time on slow file systems.
+        """
+        installed = self['buildout']['installed']
+        if not (installed and os.path.isfile(installed)):
+            return False
+        sections, entries = _read_installed(installed)
+        paths = []
+        for part in sections.get('buildout', {}).get('parts', '').split():
+            installed_files = sections.get(part, {}).get(
+                '__buildout_installed__')
+            if installed_files:
+                paths.extend([self._buildout_path(f)
+                              for f in installed_files.split('\n') if f])
+        return False not in _map_in_threads(os.path.exists, paths,
+                                            stat_threads)
 
     def _update_installed(self, **buildout_options):
         installed = self['buildout']['installed']
@@ -661,10 +1172,32 @@ class Buildout(UserDict.DictMixin):
             _save_option(option, value, f)
         f.close()
 
-    def _uninstall_part(self, part, installed_part_options):
-        # uninstall part
+    def _update_installed_part(self, part, options, **buildout_options):
+        # A part section read later replaces the earlier ones (see
+        # _read_installed), so the other parts needn't be written again.
+        installed = self['buildout']['installed']
+        f = open(installed, 'a')
+        print >>f
+        _save_options(part, options, f)
+        f.write('\n[buildout]\n')
+        for option, value in buildout_options.items():
+            _save_option(option, value, f)
+        f.close()
+
+    def _compact_installed(self):
+        installed = self['buildout']['installed']
+        if not (installed and os.path.isfile(installed)):
+            return
+        sections, entries = _read_installed(installed)
+        if entries > len(sections['buildout'].get('parts', '').split()) + 1:
+            self._save_installed_options(sections)
+
+    def _uninstall_part(self, part, installed_part_options, keep=None):
+        # uninstall part, leaving the installed path given by keep, if any,
+        # in place
         __doing__ = 'Uninstalling %s.', part
         self._logger.info(*__doing__)
+        start = _timer()
 
         # run uninstall recipe
         recipe, entry = _recipe(installed_part_options[part])
@@ -677,8 +1210,81 @@ class Buildout(UserDict.DictMixin):
             pass
 
         # remove created files and directories
-        self._uninstall(
-            installed_part_options[part]['__buildout_installed__'])
+        installed = installed_part_options[part]['__buildout_installed__']
+        if keep:
+            installed = '\n'.join([f for f in installed.split('\n')
+                                   if self._buildout_path(f) != keep])
+        self._uninstall(installed)
+        self._record_timing(part, 'uninstall', start, _timer())
+
+    def _staged_location(self, part, installed_part_options):
+        """Find where a part to be reinstalled can be installed in stages.
+
+        That's the directory named by the part's location option, if the
+        part's staged-update option is true, and the location is unchanged
+        and was installed by the part.  Returns None otherwise.
+        """
+        options = self[part]
+        if not _convert_bool('staged-update',
+                             options.get('staged-update', 'false')):
+            return None
+        location = options.get('location')
+        old_options = installed_part_options[part]
+        if not location or old_options.get('location') != location:
+            return None
+        location = self._buildout_path(location)
+        if not (os.path.isdir(location) and not os.path.islink(location)):
+            return None
+        for f in old_options['__buildout_installed__'].split('\n'):
+            if f and self._buildout_path(f) == location:
+                return location
+        return None
+
+    def _install_staged(self, part, location):
+        """Install a part through a staging directory next to its location.
+
+        The part's location option names the staging directory while the
+        recipe's install method runs.  Then the files that changed are
+        moved into the location, replacing the old ones, and the ones that
+        went away are removed.  Unchanged files are left alone and the
+        location never goes missing.  Returns what the install method did,
+        with paths in the staging directory moved to the location.
+        """
+        options = self[part]
+        staging = os.path.join(os.path.dirname(location),
+                               '.%s.staging' % os.path.basename(location))
+        if os.path.lexists(staging):
+            rmtree(staging)
+        location_option = options['location']
+        options['location'] = staging
+        try:
+            try:
+                installed_files = options._call(options.recipe.install)
+            finally:
+                options['location'] = location_option
+            staged = os.path.isdir(staging)
+            if staged:
+                _replace_tree(staging, location)
+        except:
+            # The part isn't recorded as installed anymore, so what's left
+            # of it has to go, as it would without staging.
+            for path in (staging, location):
+                _remove_path(path)
+            raise
+
+        if not staged:
+            self._logger.warning(
+                "The recipe for %s didn't install into the staging "
+                "directory, files were updated in place.", part)
+            return installed_files
+        rmtree(staging)
+
+        if isinstance(installed_files, str):
+            installed_files = [installed_files]
+        if installed_files is not None:
+            installed_files = [_unstage(f, staging, location)
+                               for f in installed_files]
+        return installed_files
 
     def _setup_directories(self):
         __doing__ = 'Setting up buildout directories'
@@ -750,30 +1356,73 @@ class Buildout(UserDict.DictMixin):
                     "Unexpected entry, %r, in develop-eggs directory.", f)
 
     def _compute_part_signatures(self, parts):
-        # Compute recipe signature and add to options
+        # Compute recipe signature and add to options.  Parts using the
+        # same recipe share its signature, which is also kept between runs
+        # in the file named by the signature-cache option, if any.
+        cache_path = self['buildout'].get('signature-cache')
+        cache = {}
+        if cache_path:
+            cache_path = os.path.join(self['buildout']['directory'],
+                                      cache_path)
+            cache = _load_marshalled(cache_path)
+            if not isinstance(cache, dict):
+                cache = {}
+        cache_changed = False
+
+        # The hashes of develop distributions can be kept between runs
+        # too, in the file named by the develop-hash-cache option.
+        hash_cache_path = self['buildout'].get('develop-hash-cache')
+        hash_cache = None
+        if hash_cache_path:
+            hash_cache_path = os.path.join(self['buildout']['directory'],
+                                           hash_cache_path)
+            hash_cache = _load_marshalled(hash_cache_path)
+            if not isinstance(hash_cache, dict):
+                hash_cache = {}
+            hashes_loaded = hash_cache.copy()
+
+        ignore = self._signature_ignore()
+        signatures = {}
         for part in parts:
             options = self.get(part)
             if options is None:
                 options = self[part] = {}
             recipe, entry = _recipe(options)
-            req = pkg_resources.Requirement.parse(recipe)
-            sig = _dists_sig(pkg_resources.working_set.resolve([req]))
-            options['__buildout_signature__'] = ' '.join(sig)
+            sig = signatures.get(recipe)
+            if sig is None:
+                sig = _cached_signature(cache.get(recipe), ignore)
+                if sig is None:
+                    req = pkg_resources.Requirement.parse(recipe)
+                    dists = pkg_resources.working_set.resolve([req])
+                    sig = ' '.join(_dists_sig(dists, hash_cache, ignore))
+                    cache[recipe] = sig, [(dist.key, dist.location,
+                                           _dist_stats(dist, ignore))
+                                          for dist in dists]
+                    cache_changed = True
+                signatures[recipe] = sig
+            options['__buildout_signature__'] = sig
+
+        if cache_path and cache_changed:
+            _save_marshalled(cache_path, cache)
+        if hash_cache_path and hash_cache != hashes_loaded:
+            _save_marshalled(hash_cache_path, hash_cache)
+
+    def _signature_ignore(self):
+        # What to leave out of the signatures of develop distributions,
+        # as passed to _walk: the patterns given by the
+        # develop-signature-ignore option and the names of the ignore
+        # files given by the develop-signature-ignore-files option.
+        options = self['buildout']
+        return (tuple(options.get('develop-signature-ignore', '').split()),
+                tuple(options.get('develop-signature-ignore-files', '')
+                      .split()))
 
     def _read_installed_part_options(self):
         old = self['buildout']['installed']
         if old and os.path.isfile(old):
-            parser = ConfigParser.RawConfigParser()
-            parser.optionxform = lambda s: s
-            parser.read(old)
+            sections, entries = _read_installed(old)
             result = {}
-            for section in parser.sections():
-                options = {}
-                for option, value in parser.items(section):
-                    if '%(' in value:
-                        for k, v in _spacey_defaults:
-                            value = value.replace(k, v)
-                    options[option] = value
+            for section, options in sections.items():
                 result[section] = Options(self, section, options)
 
             return result, True
@@ -788,7 +1437,8 @@ class Buildout(UserDict.DictMixin):
                 continue
             f = self._buildout_path(f)
             if os.path.isdir(f):
-                rmtree(f)
+                if self._trash is None or not self._trash.put(f):
+                    rmtree(f)
             elif os.path.isfile(f):
                 try:
                     os.remove(f)
@@ -1069,6 +1719,146 @@ class Buildout(UserDict.DictMixin):
     def annotate(self, args):
         _print_annotate(self._annotated)
 
+    def compile(self, args):
+        if self._snapshot is None:
+            raise zc.buildout.UserError(
+                "Configurations that extend remote files can't be compiled.")
+        path = _snapshot_path(self._snapshot[0][1])
+        _save_marshalled(path, self._snapshot)
+        self._logger.info("Compiled configuration to %s.", path)
+
+    def plan(self, args):
+        __doing__ = 'Planning.'
+
+        self._load_extensions()
+        sys.path.insert(0, self['buildout']['develop-eggs-directory'])
+
+        (installed_part_options, installed_exists
+         )= self._read_installed_part_options()
+        installed_parts = installed_part_options['buildout']['parts']
+        installed_parts = installed_parts and installed_parts.split() or []
+
+        # Decide what to do the way install does, loading the recipes,
+        # but not running them.
+        if args:
+            install_parts = args
+            uninstall_missing = False
+        else:
+            install_parts = self['buildout']['parts']
+            install_parts = install_parts and install_parts.split() or []
+            uninstall_missing = True
+        [self[part]['recipe'] for part in install_parts]
+        if not args:
+            install_parts = self._parts
+        self._compute_part_signatures(install_parts)
+        uninstall = self._parts_to_uninstall(
+            install_parts, installed_parts, installed_part_options,
+            uninstall_missing)
+
+        steps = [('Uninstall', part, reason) for (part, reason) in uninstall]
+        uninstalled = [part for (part, reason) in uninstall]
+        for part in install_parts:
+            if part in installed_parts and part not in uninstalled:
+                steps.append(('Update', part, None))
+            else:
+                steps.append(('Install', part, None))
+
+        timing_path = self._timing_history_path()
+        timings = {}
+        if timing_path:
+            timings, _ = _read_timings(timing_path)
+        total = 0.0
+        unknown = 0
+        for (action, part, reason) in steps:
+            estimate = _estimate(timings, part, action.lower())
+            if estimate is None:
+                unknown += 1
+                estimate = 'no timing history'
+            else:
+                total += estimate
+                estimate = '%.1fs' % estimate
+            if reason:
+                print '%s %s (%s): %s' % (action, part, reason, estimate)
+            else:
+                print '%s %s: %s' % (action, part, estimate)
+
+        if not steps:
+            print 'Nothing to do.'
+        elif unknown:
+            print 'Estimated time: %.1fs, not counting %d step(s).' % (
+                total, unknown)
+        else:
+            print 'Estimated time: %.1fs.' % total
+
+    def stats(self, args):
+        timing_path = self._timing_history_path()
+        if not timing_path:
+            raise zc.buildout.UserError(
+                "The timing-history option isn't set.")
+
+        timings, _ = _read_timings(timing_path)
+        if args:
+            timings = dict([(key, history)
+                            for (key, history) in timings.items()
+                            if key[0] in args])
+        if not timings:
+            print 'No timings were recorded.'
+            return
+
+        rows, regressions = _timing_report(timings)
+        rows.insert(0, ['Step', 'Runs', 'Median', 'Latest', 'CPU', 'Files',
+                        'Trend'])
+        widths = [max([len(row[i]) for row in rows])
+                  for i in range(len(rows[0]))]
+        for row in rows:
+            columns = [row[0].ljust(widths[0])]
+            columns.extend([column.rjust(width)
+                            for (column, width) in zip(row[1:], widths[1:])])
+            print '  '.join(columns).rstrip()
+        if regressions:
+            print
+            print 'Regressions:'
+            for regression in regressions:
+                print '  ' + regression
+
+    def verify(self, args):
+        manifest_path, manifest_hash = self._manifest_settings()
+        if not manifest_path:
+            raise zc.buildout.UserError(
+                "The installed-manifest option isn't set.")
+
+        installed_part_options, _ = self._read_installed_part_options()
+        installed_parts = installed_part_options['buildout']['parts'].split()
+        parts = args or installed_parts
+        for part in parts:
+            if part not in installed_parts:
+                raise zc.buildout.UserError("Part %s isn't installed." % part)
+
+        manifests, _ = _read_manifests(manifest_path)
+        drifted = []
+        for part in parts:
+            # A part reinstalled while no manifests were recorded has none.
+            options = installed_part_options[part]
+            key, recorded = manifests.get(part, (None, None))
+            if key != _options_key(options):
+                self._logger.warning(
+                    "No manifest was recorded for part %s.", part)
+                continue
+            installed_files = options['__buildout_installed__']
+            current = _manifest([self._buildout_path(f)
+                                 for f in installed_files.split('\n') if f],
+                                manifest_hash)
+            drift = _manifest_drift(recorded, current)
+            if drift:
+                drifted.append(part)
+                print 'Part %s:' % part
+                for path, change in drift:
+                    print '  %s %s' % (change, path)
+
+        if drifted:
+            raise zc.buildout.UserError(
+                "Installed files changed for parts: %s" % ' '.join(drifted))
+
     def __getitem__(self, section):
         __doing__ = 'Getting section %s.', section
         try:
@@ -1099,6 +1889,11 @@ class Buildout(UserDict.DictMixin):
         return iter(self._raw)
 
 
+def _reraise(exc_info):
+    # Raising with a traceback doesn't add the frame doing so to it, so
+    # this is how the caller gets into it, along with its __doing__.
+    raise exc_info[0], exc_info[1], exc_info[2]
+
 def _install_and_load(spec, group, entry, buildout):
     __doing__ = 'Loading recipe %r.', spec
     try:
@@ -1166,6 +1961,18 @@ class Options(UserDict.DictMixin):
         if not recipe:
             return
 
+        # Parts named in depends-on are installed first, like the parts
+        # referred to in substitutions.
+        for section in self.get('depends-on', '').split():
+            self.buildout[section]
+
+        # Whether the part is installed in stages when it has to be
+        # installed again (see Buildout._install_staged), and whether it
+        # can be installed while other parts are (see
+        # Buildout._parallel_safe).
+        _convert_bool('staged-update', self.get('staged-update', 'false'))
+        _convert_bool('parallel-safe', self.get('parallel-safe', 'false'))
+
         reqs, entry = _recipe(self._data)
         buildout = self.buildout
         recipe_class = _install_and_load(reqs, 'zc.buildout', entry, buildout)
@@ -1203,9 +2010,14 @@ class Options(UserDict.DictMixin):
 
     def _dosub(self, option, v):
         __doing__ = 'Getting option %s:%s.', self.name, option
-        seen = [(self.name, option)]
-        v = '$$'.join([self._sub(s, seen) for s in v.split('$$')])
-        self._cooked[option] = v
+        try:
+            # The option may have been computed already, when another
+            # section referred to it.
+            self._cooked[option] = self._data[option]
+            return
+        except KeyError:
+            pass
+        self._cooked[option] = self._sub(v, set([(self.name, option)]))
 
     def get(self, option, default=None, seen=None):
         try:
@@ -1224,15 +2036,15 @@ class Options(UserDict.DictMixin):
         if '${' in v:
             key = self.name, option
             if seen is None:
-                seen = [key]
+                seen = set([key])
             elif key in seen:
                 raise zc.buildout.UserError(
                     "Circular reference in substitutions.\n"
                     )
             else:
-                seen.append(key)
-            v = '$$'.join([self._sub(s, seen) for s in v.split('$$')])
-            seen.pop()
+                seen.add(key)
+            v = self._sub(v, seen)
+            seen.discard(key)
 
         self._data[option] = v
         return v
@@ -1240,32 +2052,85 @@ class Options(UserDict.DictMixin):
     _template_split = re.compile('([$]{[^}]*})').split
     _simple = re.compile('[-a-zA-Z0-9 ._]+$').match
     _valid = re.compile('\${[-a-zA-Z0-9 ._]*:[-a-zA-Z0-9 ._]+}$').match
+
+    # Values are tokenized only once, as many options share the same value
+    # and each value is substituted at least twice (see _dosub).
+    _tokenized = {}
+
+    def _tokenize(self, value):
+        """Split a value into text and references to other options.
+
+        Returns a tuple of text strings and (section, option) tuples. A
+        reference that isn't valid is represented by a 1-tuple holding the
+        error message, which is raised when the reference is substituted.
+        """
+        tokens = []
+        for template in value.split('$$'):
+            if tokens:
+                tokens.append('$$')
+            split = self._template_split(template)
+            for i in range(len(split)):
+                if not i % 2:
+                    if split[i]:
+                        tokens.append(split[i])
+                    continue
+                ref = split[i]
+                s = tuple(ref[2:-1].split(':'))
+                if not self._valid(ref):
+                    if len(s) < 2:
+                        tokens.append(("The substitution, %s,\n"
+                                       "doesn't contain a colon."
+                                       % ref, ))
+                    elif len(s) > 2:
+                        tokens.append(("The substitution, %s,\n"
+                                       "has too many colons."
+                                       % ref, ))
+                    elif not self._simple(s[0]):
+                        tokens.append(("The section name in substitution, %s,"
+                                       "\nhas invalid characters."
+                                       % ref, ))
+                    elif not self._simple(s[1]):
+                        tokens.append(("The option name in substitution, %s,"
+                                       "\nhas invalid characters."
+                                       % ref, ))
+                    else:
+                        tokens.append(s)
+                else:
+                    tokens.append(s)
+        return tuple(tokens)
+
+    def _tokens(self, template):
+        try:
+            return self._tokenized[template]
+        except KeyError:
+            tokens = self._tokenized[template] = self._tokenize(template)
+            return tokens
+
+    def _references(self):
+        """Return the names of the other sections referred to by values.
+        """
+        result = set()
+        for value in self._raw.values():
+            if '${' not in value:
+                continue
+            for token in self._tokens(value):
+                if isinstance(token, tuple) and len(token) == 2:
+                    result.add(token[0] or self.name)
+        result.discard(self.name)
+        return result
+
     def _sub(self, template, seen):
-        value = self._template_split(template)
-        subs = []
-        for ref in value[1::2]:
-            s = tuple(ref[2:-1].split(':'))
-            if not self._valid(ref):
-                if len(s) < 2:
-                    raise zc.buildout.UserError("The substitution, %s,\n"
-                                                "doesn't contain a colon."
-                                                % ref)
-                if len(s) > 2:
-                    raise zc.buildout.UserError("The substitution, %s,\n"
-                                                "has too many colons."
-                                                % ref)
-                if not self._simple(s[0]):
-                    raise zc.buildout.UserError(
-                        "The section name in substitution, %s,\n"
-                        "has invalid characters."
-                        % ref)
-                if not self._simple(s[1]):
-                    raise zc.buildout.UserError(
-                        "The option name in substitution, %s,\n"
-                        "has invalid characters."
-                        % ref)
+        tokens = self._tokens(template)
+
+        result = []
+        for token in tokens:
+            if not isinstance(token, tuple):
+                result.append(token)
+                continue
+            if len(token) == 1:
+                raise zc.buildout.UserError(token[0])
 
-            section, option = s
+            section, option = token
             if not section:
                 section = self.name
             v = self.buildout[section].get(option, None, seen)
@@ -1275,10 +2140,9 @@ class Options(UserDict.DictMixin):
                 else:
                     raise MissingOption("Referenced option does not exist:",
                                         section, option)
-            subs.append(v)
-        subs.append('')
+            result.append(v)
 
-        return ''.join([''.join(v) for v in zip(value[::2], subs)])
+        return ''.join(result)
 
     def __getitem__(self, key):
         try:
@@ -1402,6 +2266,75 @@ def _quote_spacey_nl(match):
         )
     return result
 
+_spacey_default = re.compile(r'%\(__buildout_space(_[nrfv])?__\)s')
+
+def _unquote_spacey_default(match, spacey_defaults=dict(_spacey_defaults)):
+    return spacey_defaults[match.group(0)]
+
+def _read_installed(filename):
+    """Read an installed-parts database.
+
+    The database is a journal.  The buildout section is updated by
+    appending buildout sections with the options that changed, and parts
+    by appending complete sections, which replace the earlier sections for
+    the same part.  Otherwise, files are read as RawConfigParser would, so
+    databases saved by earlier releases are read as they always were.
+
+    Returns the sections and the number of sections in the file.
+    """
+    sections = {}
+    entries = 0
+    options = option = None
+    f = open(filename)
+    try:
+        for line in f:
+            if not line.strip() or line[0] in '#;':
+                continue
+            if line[0] in 'rR' and line.split(None, 1)[0].lower() == 'rem':
+                continue
+            if line[0].isspace():
+                if option is not None:
+                    value = line.strip()
+                    if value:
+                        options[option].append(value)
+                continue
+
+            match = ConfigParser.RawConfigParser.SECTCRE.match(line)
+            if match is not None:
+                section = match.group('header')
+                entries += 1
+                if section == 'buildout':
+                    options = sections.setdefault(section, {})
+                else:
+                    options = sections[section] = {}
+                option = None
+                continue
+
+            match = ConfigParser.RawConfigParser.OPTCRE.match(line)
+            if options is None or match is None:
+                raise zc.buildout.UserError(
+                    "Can't read line %r of %s" % (line, filename))
+            option, value = match.group('option', 'value')
+            option = option.rstrip()
+            pos = value.find(';')
+            if pos != -1 and value[pos-1].isspace():
+                value = value[:pos]
+            value = value.strip()
+            if value == '""':
+                value = ''
+            options[option] = [value]
+    finally:
+        f.close()
+
+    for options in sections.values():
+        for option, value in options.items():
+            value = '\n'.join(value)
+            if '%(' in value:
+                value = _spacey_default.sub(_unquote_spacey_default, value)
+            options[option] = value
+
+    return sections, entries
+
 def _save_option(option, value, f):
     value = _spacey_nl.sub(_quote_spacey_nl, value)
     if value.startswith('\n\t'):
@@ -1417,56 +2350,17 @@ def _save_options(section, options, f):
     for option, value in items:
         _save_option(option, value, f)
 
-def _open(base, filename, seen, dl_options, override, downloaded):
-    """Open a configuration file and return the result as a dictionary,
+def _parse_config(fp, filename):
+    """Parse a configuration file into unannotated sections.
 
-    Recursively open other files based on buildout options found.
+    Returns a tuple of the section data and the value of the buildout
+    section's extends option, which is removed from the section data.
     """
-    _update_section(dl_options, override)
-    _dl_options = _unannotate_section(dl_options.copy())
-    newest = _convert_bool('newest', _dl_options.get('newest', 'false'))
-    fallback = newest and not (filename in downloaded)
-    download = zc.buildout.download.Download(
-        _dl_options, cache=_dl_options.get('extends-cache'),
-        fallback=fallback, hash_name=True)
-    is_temp = False
-    if _isurl(filename):
-        path, is_temp = download(filename)
-        fp = open(path)
-        base = filename[:filename.rfind('/')]
-    elif _isurl(base):
-        if os.path.isabs(filename):
-            fp = open(filename)
-            base = os.path.dirname(filename)
-        else:
-            filename = base + '/' + filename
-            path, is_temp = download(filename)
-            fp = open(path)
-            base = filename[:filename.rfind('/')]
-    else:
-        filename = os.path.join(base, filename)
-        fp = open(filename)
-        base = os.path.dirname(filename)
-    downloaded.add(filename)
-
-    if filename in seen:
-        if is_temp:
-            fp.close()
-            os.remove(path)
-        raise zc.buildout.UserError("Recursive file include", seen, filename)
-
-    root_config_file = not seen
-    seen.append(filename)
-
-    result = {}
-
     parser = ConfigParser.RawConfigParser()
     parser.optionxform = lambda s: s
     parser.readfp(fp)
-    if is_temp:
-        fp.close()
-        os.remove(path)
 
+    result = {}
     extends = None
     for section in parser.sections():
         options = dict(parser.items(section))
@@ -1477,51 +2371,759 @@ def _open(base, filename, seen, dl_options, override, downloaded):
                     'No-longer supported "extended-by" option found in %s.' %
                     filename)
         result[section] = options
+    return result, extends
+
+def _parse_cache_key(filename, fp, is_url):
+    # Local files are identified by their stat data. Downloaded files
+    # may be fresh temporary copies, so we identify them by content.
+    if is_url:
+        key = filename + '\0' + fp.read()
+        fp.seek(0)
+        return md5(key).hexdigest()
+    st = os.fstat(fp.fileno())
+    return md5(repr((filename, st.st_ino, st.st_size, st.st_mtime))
+               ).hexdigest()
+
+def _load_marshalled(path):
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        return None
+    try:
+        try:
+            return marshal.load(f)
+        except (EOFError, ValueError, TypeError):
+            return None
+    finally:
+        f.close()
+
+def _load_parsed_config(cache_path):
+    parsed = _load_marshalled(cache_path)
+    if not (isinstance(parsed, tuple) and len(parsed) == 2):
+        # A truncated or foreign entry. We'll just parse again.
+        return None
+    return parsed
+
+def _save_marshalled(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        os.write(fd, marshal.dumps(data))
+    finally:
+        os.close(fd)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # Windows won't rename over an existing file; another run may
+        # have written the file in the meantime, which is just as good.
+        os.remove(tmp)
+
+def _read_config(filename, is_url, dl_options):
+    """Read and parse a single configuration file, downloading it if needed.
+    """
+    is_temp = False
+    if is_url:
+        newest = _convert_bool('newest', dl_options.get('newest', 'false'))
+        download = zc.buildout.download.Download(
+            dl_options, cache=dl_options.get('extends-cache'),
+            fallback=newest, hash_name=True)
+        path, is_temp = download(filename)
+    else:
+        path = filename
+    fp = open(path)
 
-    result = _annotate(result, filename)
+    try:
+        parse_cache = dl_options.get('parse-cache')
+        cache_path = parsed = None
+        if parse_cache:
+            parse_cache = os.path.join(dl_options.get('directory', ''),
+                                       parse_cache)
+            if not os.path.isdir(parse_cache):
+                os.mkdir(parse_cache)
+            cache_path = os.path.join(
+                parse_cache, _parse_cache_key(filename, fp, is_url))
+            parsed = _load_parsed_config(cache_path)
+
+        if parsed is None:
+            parsed = _parse_config(fp, filename)
+            if cache_path:
+                _save_marshalled(cache_path, parsed)
+    finally:
+        fp.close()
+        if is_temp:
+            os.remove(path)
+
+    return parsed
+
+# Compiled configurations (see Buildout.compile) hold the configuration
+# data merged from the defaults and the configuration files, together
+# with the stat data of every file read, so that it can be used as long
+# as none of these files change.
+_snapshot_format = 1
+
+def _snapshot_path(config_file):
+    return os.path.join(os.path.dirname(config_file),
+                        '.%s.compiled' % os.path.basename(config_file))
+
+def _file_stats(filenames):
+    result = []
+    for filename in filenames:
+        try:
+            st = os.stat(filename)
+        except OSError:
+            # Files that don't exist count too, as creating them changes
+            # the configuration.
+            result.append((filename, None))
+        else:
+            result.append((filename, (st.st_size, st.st_mtime)))
+    return tuple(result)
+
+def _load_snapshot(config_file, key):
+    snapshot = _load_marshalled(_snapshot_path(config_file))
+    if not (isinstance(snapshot, tuple) and len(snapshot) == 3):
+        return None
+    snapshot_key, inputs, data = snapshot
+    if snapshot_key != key:
+        return None
+    if _file_stats([filename for (filename, _) in inputs]) != inputs:
+        return None
+    return data
+
+def _resolve_config(base, filename):
+    """Resolve a configuration file name relative to a base path or URL.
+
+    Returns the full file name or URL, the base for files it extends and
+    whether it needs to be downloaded.
+    """
+    if _isurl(filename):
+        return filename, filename[:filename.rfind('/')], True
+    if _isurl(base) and not os.path.isabs(filename):
+        filename = base + '/' + filename
+        return filename, filename[:filename.rfind('/')], True
+    filename = os.path.join(base, filename)
+    return filename, os.path.dirname(filename), False
+
+prefetch_threads = 8
+
+def _prefetch_configs(base, extends, dl_options, opened):
+    """Download and parse the remote configuration files among extends.
+
+    The files are read by up to ``prefetch_threads`` threads and added to
+    ``opened``, where _open will find them when it gets to them in the
+    usual order. If reading a file fails, it is left out so that _open
+    reads it again and reports the error when and where it always has.
+    """
+    urls = []
+    for filename in extends:
+        filename, _, is_url = _resolve_config(base, filename)
+        if is_url and filename not in opened and filename not in urls:
+            urls.append(filename)
+    if len(urls) < 2:
+        return
+
+    def prefetch():
+        while True:
+            try:
+                url = urls.pop(0)
+            except IndexError:
+                return
+            try:
+                opened[url] = [_read_config(url, True, dl_options), 0]
+            except Exception:
+                pass
+
+    threads = [threading.Thread(target=prefetch)
+               for i in range(min(len(urls), prefetch_threads))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+stat_threads = 8
+
+def _map_in_threads(function, items, threads):
+    """Return the results of calling function on each of the items.
+
+    The calls are made by up to the given number of threads, which pays
+    off for functions that mostly wait on the file system, like os.stat
+    on network file systems.  The function mustn't raise.
+    """
+    items = list(items)
+    if threads < 2 or len(items) < 2:
+        return map(function, items)
+    results = [None] * len(items)
+    todo = range(len(items))
+
+    def work():
+        while True:
+            try:
+                i = todo.pop()
+            except IndexError:
+                return
+            results[i] = function(items[i])
+
+    threads = [threading.Thread(target=work)
+               for i in range(min(len(items), threads))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def _open(base, filename, seen, dl_options, override, opened):
+    """Open a configuration file and return the result as a dictionary,
+
+    Recursively open other files based on buildout options found.
+
+    Each file is read only once per run: ``opened`` maps the files read so
+    far to their parsed data and the number of times it has been used.
+    """
+    _update_section(dl_options, override)
+    _dl_options = _unannotate_section(dl_options.copy())
+    filename, base, is_url = _resolve_config(base, filename)
+
+    if filename in seen:
+        raise zc.buildout.UserError("Recursive file include", seen, filename)
+
+    if filename not in opened:
+        opened[filename] = [_read_config(filename, is_url, _dl_options), 0]
+    opened[filename][1] += 1
+    sections, extends = opened[filename][0]
+
+    root_config_file = not seen
+    seen.append(filename)
+
+    # Annotating and merging modify the sections in place, so we keep the
+    # parsed data pristine for the next time this file is extended.
+    result = _annotate(dict([(section, options.copy())
+                             for (section, options) in sections.items()]),
+                       filename)
 
     if root_config_file and 'buildout' in result:
         dl_options = _update_section(dl_options, result['buildout'])
 
     if extends:
         extends = extends.split()
+        _prefetch_configs(
+            base, extends,
+            _unannotate_section(_update_section(dl_options.copy(), override)),
+            opened)
         eresult = _open(base, extends.pop(0), seen, dl_options, override,
-                        downloaded)
+                        opened)
         for fname in extends:
             _update(eresult, _open(base, fname, seen, dl_options, override,
-                    downloaded))
+                    opened))
         result = _update(eresult, result)
 
     seen.pop()
     return result
 
 
+# Buildout options that don't change what a run that isn't in newest mode
+# would do after a successful one.
+_unfingerprinted_options = 'verbosity', 'newest', 'offline'
+
 ignore_directories = '.svn', 'CVS'
+
+def _ignore_rules(lines, base, syntax='glob'):
+    """Parse ignore patterns, as found in .gitignore or .hgignore files.
+
+    Glob patterns without a slash, other than a trailing one, match names
+    anywhere below the base directory, other glob patterns match paths
+    relative to it, so a leading slash anchors a pattern there.  A
+    trailing slash restricts a pattern to directories and a leading "!"
+    includes again what earlier patterns excluded.  As in .hgignore
+    files, "syntax: regexp" switches to regular expressions searched for
+    in the relative paths, and "syntax: glob" back.
+
+    Returns a list of rules for _ignored.
+    """
+    rules = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('syntax:'):
+            syntax = line[7:].strip()
+            continue
+        if syntax not in ('glob', 'relglob'):
+            rules.append((base, False, re.compile(line).search, False, False))
+            continue
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if line.startswith('**/'):
+            line = line[3:]
+        by_name = '/' not in line
+        line = line.lstrip('/')
+        if not line:
+            continue
+        match = re.compile(fnmatch.translate(line)).match
+        rules.append((base, by_name, match, negate, dir_only))
+    return rules
+
+def _ignored(rules, path, name, isdir):
+    # Whether the last rule matching a path, relative to the top of the
+    # walk, excludes it.
+    ignored = False
+    for (base, by_name, match, negate, dir_only) in rules:
+        if (ignored == negate and (isdir or not dir_only)
+            and path.startswith(base)
+            and match(by_name and name or path[len(base):])):
+            ignored = not negate
+    return ignored
+
+def _walk(dir, ignore=None):
+    """Walk a directory tree like os.walk, leaving out ignored entries.
+
+    Entries named in ignore_directories are always left out.  The ignore
+    argument is a tuple of patterns, as parsed by _ignore_rules, and of
+    the names of ignore files, which apply to the directories they're
+    found in.  Directories left out aren't walked.
+    """
+    patterns, ignore_files = ignore or ((), ())
+    walk_rules = {dir: _ignore_rules(patterns, '')}
+    top = os.path.join(dir, '')
+    for (dirpath, dirnames, filenames) in os.walk(dir):
+        rules = walk_rules.pop(dirpath, [])
+        prefix = ''
+        if dirpath != dir:
+            prefix = dirpath[len(top):].replace(os.sep, '/') + '/'
+        for name in ignore_files:
+            if name in filenames:
+                syntax = 'glob'
+                if name.endswith('.hgignore'):
+                    syntax = 'regexp'
+                f = open(os.path.join(dirpath, name))
+                try:
+                    rules = rules + _ignore_rules(f, prefix, syntax)
+                finally:
+                    f.close()
+        dirnames[:] = [n for n in dirnames
+                       if not (n in ignore_directories or
+                               _ignored(rules, prefix + n, n, True))]
+        if rules:
+            filenames[:] = [n for n in filenames
+                            if not _ignored(rules, prefix + n, n, False)]
+            for n in dirnames:
+                walk_rules[os.path.join(dirpath, n)] = rules
+        yield (dirpath, dirnames, filenames)
+
+def _dir_stats(dir, ignore=None):
+    # The files _dir_hash would read, with their sizes and modification
+    # times rather than their contents.
+    filenames = []
+    for (dirpath, dirnames, names) in _walk(dir, ignore):
+        dirnames.sort()
+        names.sort()
+        filenames.extend([os.path.join(dirpath, name) for name in names
+                          if not (name.endswith('pyc') or name.endswith('pyo'))
+                          ])
+    return _file_stats(filenames)
+
+def _manifest(paths, hash=False):
+    """Describe the given files and everything in the given directories.
+
+    Returns a dictionary mapping the paths found to their states, as
+    returned by _manifest_state.  Paths that don't exist are left out.
+    """
+    filenames = []
+    for path in paths:
+        filenames.append(path)
+        if os.path.isdir(path) and not os.path.islink(path):
+            for (dirpath, dirnames, names) in os.walk(path):
+                filenames.extend([os.path.join(dirpath, name)
+                                  for name in dirnames + names])
+    states = _map_in_threads(lambda path: _manifest_state(path, hash),
+                             filenames, stat_threads)
+    return dict([(path, state) for (path, state) in zip(filenames, states)
+                 if state is not None])
+
+def _manifest_state(path, hash=False):
+    # Files are described by their sizes and modification times, and their
+    # MD5 checksums when asked for. Directories and symbolic links aren't
+    # followed.
+    try:
+        st = os.lstat(path)
+        if stat.S_ISDIR(st.st_mode):
+            return ('d', )
+        if stat.S_ISLNK(st.st_mode):
+            return ('l', os.readlink(path))
+        digest = None
+        if hash and stat.S_ISREG(st.st_mode):
+            digest = _file_md5(path)
+        return ('f', st.st_size, st.st_mtime, digest)
+    except (IOError, OSError):
+        return None
+
+def _file_md5(path):
+    f = open(path, 'rb')
+    try:
+        checksum = md5()
+        chunk = f.read(2**16)
+        while chunk:
+            checksum.update(chunk)
+            chunk = f.read(2**16)
+        return checksum.hexdigest()
+    finally:
+        f.close()
+
+def _manifest_drift(recorded, current):
+    """Compare a recorded manifest with the current one.
+
+    Returns a sorted list of (path, change) pairs, where change is one of
+    'changed', 'missing' and 'added'.  Files recorded with a checksum
+    have changed if their size or checksum did, others if their size or
+    modification time did.
+    """
+    result = []
+    for path, state in recorded.items():
+        now = current.get(path)
+        if now is None:
+            result.append((path, 'missing'))
+        elif state[0] != 'f' or now[0] != 'f':
+            if state != now:
+                result.append((path, 'changed'))
+        elif state[3] is not None and now[3] is not None:
+            if (state[1], state[3]) != (now[1], now[3]):
+                result.append((path, 'changed'))
+        elif state[1:3] != now[1:3]:
+            result.append((path, 'changed'))
+    for path in current:
+        if path not in recorded:
+            result.append((path, 'added'))
+    result.sort()
+    return result
+
+def _options_key(options):
+    items = options.items()
+    items.sort()
+    return md5(repr(items)).hexdigest()
+
+def _read_manifests(path):
+    """Read a file of installed-file manifests.
+
+    The file holds marshalled (part, key, manifest) records, later ones
+    replacing earlier ones for the same part.  The keys identify the
+    installed options of the parts, as returned by _options_key.  Returns
+    a dictionary mapping parts to their keys and manifests, and the
+    number of records read.
+    """
+    manifests = {}
+    records = 0
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        return manifests, records
+    try:
+        while True:
+            try:
+                part, key, manifest = marshal.load(f)
+            except EOFError:
+                break
+            except (ValueError, TypeError):
+                # A damaged record, maybe from an interrupted run.  The
+                # parts recorded after it will be verified as unknown.
+                break
+            manifests[part] = key, manifest
+            records += 1
+    finally:
+        f.close()
+    return manifests, records
+
+# The number of timing records kept for each action on each part.
+timing_history_size = 20
+
+# How many times the median time of a step, and how many seconds more,
+# the latest one has to take to count as a regression, and the number of
+# earlier records needed.  Trends aren't reported for steps taking less
+# than trend_minimum seconds, as they're mostly noise.
+regression_factor = 1.5
+regression_minimum = 1.0
+regression_history = 3
+trend_minimum = 0.1
+
+_timing_lock = threading.Lock()
+
+def _timer():
+    # The wall time and the CPU time used by the process and the
+    # subprocesses it waited for.
+    times = os.times()
+    return time.time(), times[0] + times[1] + times[2] + times[3]
+
+def _count_files(paths):
+    count = 0
+    for path in paths:
+        if os.path.isdir(path) and not os.path.islink(path):
+            for (dirpath, dirnames, filenames) in os.walk(path):
+                count += len(filenames)
+        elif path and os.path.lexists(path):
+            count += 1
+    return count
+
+def _read_timings(path):
+    """Read a file of timing records.
+
+    The file holds marshalled (part, action, stats) records, where the
+    action is "install", "update" or "uninstall" and the stats are a
+    dictionary holding the time the action was started at, the wall and
+    CPU times it took and, for installs and updates, the number of files
+    in the paths installed.  Phases of install runs other than parts are
+    recorded with a part of None and an action of "load", for loading the
+    configuration, "extensions" or "develop".  Returns a dictionary
+    mapping parts and actions to the lists of their stats, oldest first,
+    and the number of records read.
+    """
+    timings = {}
+    records = 0
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        return timings, records
+    try:
+        while True:
+            try:
+                part, action, stats = marshal.load(f)
+            except EOFError:
+                break
+            except (ValueError, TypeError):
+                # A damaged record, maybe from an interrupted run.
+                break
+            timings.setdefault((part, action), []).append(stats)
+            records += 1
+    finally:
+        f.close()
+    return timings, records
+
+def _compact_timings(path):
+    # Keep the latest timing_history_size records for each action on
+    # each part.
+    timings, records = _read_timings(path)
+    kept = []
+    for (part, action), history in timings.items():
+        kept.extend([(stats['time'], part, action, stats)
+                     for stats in history[-timing_history_size:]])
+    if len(kept) < records:
+        kept.sort()
+        f = open(path, 'wb')
+        try:
+            for (start, part, action, stats) in kept:
+                marshal.dump((part, action, stats), f)
+        finally:
+            f.close()
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+_phase_names = {
+    'load': 'load configuration',
+    'extensions': 'load extensions',
+    'develop': 'develop',
+    }
+
+def _timing_report(timings):
+    """Summarize timing records, as read by _read_timings.
+
+    Returns a list of the steps recorded, slowest first by median wall
+    time, each with a row of columns, and a list of regressions.  The
+    trend of a step is the change from the median of the older half of
+    its records to that of the newer half.
+    """
+    rows = []
+    regressions = []
+    for (part, action), history in timings.items():
+        if part is None:
+            step = _phase_names.get(action, action)
+        else:
+            step = '%s %s' % (action, part)
+        walls = [stats['wall'] for stats in history]
+        median = _median(walls)
+        latest = history[-1]
+        cpu = latest.get('cpu')
+        if cpu is None:
+            cpu = ''
+        else:
+            cpu = '%.1fs' % cpu
+        trend = ''
+        if len(walls) >= 4:
+            half = len(walls) // 2
+            older = _median(walls[:half])
+            if older >= trend_minimum:
+                trend = '%+d%%' % round(
+                    (_median(walls[-half:]) - older) * 100 / older)
+        rows.append((median, step, [
+            step, str(len(walls)), '%.1fs' % median,
+            '%.1fs' % latest['wall'], cpu, str(latest.get('files', '')),
+            trend]))
+
+        if len(walls) > regression_history:
+            earlier = _median(walls[:-1])
+            if (earlier > 0 and walls[-1] > earlier * regression_factor
+                and walls[-1] - earlier >= regression_minimum):
+                regressions.append(
+                    '%s took %.1fs, %.1f times the median of %.1fs'
+                    % (step, walls[-1], walls[-1] / earlier, earlier))
+
+    rows.sort()
+    rows.reverse()
+    return [row for (median, step, row) in rows], regressions
+
+def _estimate(timings, part, action):
+    # The median wall time recorded for an action on a part, if any.
+    history = timings.get((part, action))
+    if history:
+        return _median([stats['wall'] for stats in history])
+
+def _same_file(path1, path2):
+    if os.path.islink(path1) or os.path.islink(path2):
+        return (os.path.islink(path1) and os.path.islink(path2)
+                and os.readlink(path1) == os.readlink(path2))
+    if not (os.path.isfile(path1) and os.path.isfile(path2)):
+        return False
+    st1 = os.stat(path1)
+    st2 = os.stat(path2)
+    return (st1.st_size == st2.st_size
+            and stat.S_IMODE(st1.st_mode) == stat.S_IMODE(st2.st_mode)
+            and filecmp.cmp(path1, path2, False))
+
+def _remove_path(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+def _replace_tree(source, dest):
+    """Make a directory tree the same as another by moving files over.
+
+    Files in dest that are the same as those in source are left alone.
+    Others are replaced by renaming the files in source over them, which
+    replaces them atomically on POSIX systems, except that directories
+    are removed before others are renamed over them and the other way
+    around.  Files and directories that aren't in source are removed from
+    dest.
+    """
+    for (dirpath, dirnames, filenames) in os.walk(source):
+        target = dest + dirpath[len(source):]
+        names = os.listdir(dirpath)
+        for name in os.listdir(target):
+            if name not in names:
+                _remove_path(os.path.join(target, name))
+        for name in names:
+            path = os.path.join(dirpath, name)
+            target_path = os.path.join(target, name)
+            if name in dirnames and not os.path.islink(path):
+                if (os.path.isdir(target_path)
+                    and not os.path.islink(target_path)):
+                    continue
+                dirnames.remove(name)
+            elif _same_file(path, target_path):
+                continue
+            if os.path.isdir(target_path) and not os.path.islink(target_path):
+                rmtree(target_path)
+            elif os.path.lexists(target_path) and (
+                sys.platform == 'win32' or
+                (os.path.isdir(path) and not os.path.islink(path))):
+                # Directories can't be renamed over files or symbolic links.
+                os.remove(target_path)
+            os.rename(path, target_path)
+
+def _unstage(path, staging, location):
+    # The path at the location corresponding to a path in the staging
+    # directory.
+    full = os.path.abspath(path)
+    if full == staging or full.startswith(os.path.join(staging, '')):
+        return location + full[len(staging):]
+    return path
+
 _dir_hashes = {}
-def _dir_hash(dir):
-    dir_hash = _dir_hashes.get(dir, None)
+def _dir_hash(dir, cache=None, ignore=None):
+    """Hash the names and contents of the files in a directory tree.
+
+    Files and directories are left out as described by the ignore
+    argument (see _walk).
+
+    If a cache dictionary is given, the hash is looked up there by the
+    directory, along with the inode, size and modification time of each
+    file, and stored there when it has to be computed.
+    """
+    key = dir, ignore
+    dir_hash = _dir_hashes.get(key, None)
     if dir_hash is not None:
         return dir_hash
-    hash = md5()
-    for (dirpath, dirnames, filenames) in os.walk(dir):
-        dirnames[:] = [n for n in dirnames if n not in ignore_directories]
+    walked = []
+    for (dirpath, dirnames, filenames) in _walk(dir, ignore):
         filenames[:] = [f for f in filenames
                         if (not (f.endswith('pyc') or f.endswith('pyo'))
                             and os.path.exists(os.path.join(dirpath, f)))
                         ]
-        hash.update(' '.join(dirnames))
-        hash.update(' '.join(filenames))
-        for name in filenames:
-            hash.update(open(os.path.join(dirpath, name)).read())
-    _dir_hashes[dir] = dir_hash = hash.digest().encode('base64').strip()
+        walked.append((dirpath, list(dirnames), list(filenames)))
+
+    if cache is not None:
+        state = []
+        for (dirpath, dirnames, filenames) in walked:
+            files = []
+            for name in filenames:
+                st = os.stat(os.path.join(dirpath, name))
+                files.append((name, st.st_ino, st.st_size, st.st_mtime))
+            state.append((dirpath, dirnames, files))
+        entry = cache.get(dir)
+        if isinstance(entry, tuple) and entry[0] == state:
+            _dir_hashes[key] = dir_hash = entry[1]
+            return dir_hash
+
+    hash = md5()
+    reader = zc.buildout.filehash.Reader(
+        [os.path.join(dirpath, name)
+         for (dirpath, dirnames, filenames) in walked
+         for name in filenames],
+        'r')
+    try:
+        for (dirpath, dirnames, filenames) in walked:
+            hash.update(' '.join(dirnames))
+            hash.update(' '.join(filenames))
+            for name in filenames:
+                reader.update(hash)
+    finally:
+        reader.close()
+    _dir_hashes[key] = dir_hash = hash.digest().encode('base64').strip()
+    if cache is not None:
+        cache[dir] = state, dir_hash
     return dir_hash
 
-def _dists_sig(dists):
+def _dist_stats(dist, ignore=None):
+    # What the signature of a distribution depends on, short of hashing
+    # develop distributions.
+    if dist.precedence == pkg_resources.DEVELOP_DIST:
+        return _dir_stats(dist.location, ignore)
+    return _file_stats([dist.location])[0][1]
+
+def _cached_signature(entry, ignore=None):
+    # A recipe signature computed by an earlier run still holds if the
+    # distributions it was computed from are still the active ones for
+    # their projects, at the same locations and unchanged.
+    if not (isinstance(entry, tuple) and len(entry) == 2):
+        return None
+    sig, dists = entry
+    by_key = pkg_resources.working_set.by_key
+    for key, location, stats in dists:
+        dist = by_key.get(key)
+        if (dist is None or dist.location != location
+            or _dist_stats(dist, ignore) != stats):
+            return None
+    return sig
+
+def _dists_sig(dists, hash_cache=None, ignore=None):
     result = []
     for dist in dists:
         location = dist.location
         if dist.precedence == pkg_resources.DEVELOP_DIST:
-            result.append(dist.project_name + '-' + _dir_hash(location))
+            result.append(dist.project_name + '-'
+                          + _dir_hash(location, hash_cache, ignore))
         else:
             result.append(os.path.basename(location))
     return result
@@ -1534,16 +3136,18 @@ def _update_section(s1, s2):
             key = k.rstrip(' +')
             v1, note1 = s1.get(key, ("", ""))
             newnote = ' [+] '.join((note1, note2)).strip()
-            s2[key] = "\n".join((v1).split('\n') +
-                v2.split('\n')), newnote
+            s2[key] = v1 + '\n' + v2, newnote
             del s2[k]
         elif k.endswith('-'):
             key = k.rstrip(' -')
             v1, note1 = s1.get(key, ("", ""))
             newnote = ' [-] '.join((note1, note2)).strip()
+            # Keep the remaining lines in order, looking up the lines to
+            # remove in a set, as both lists can be long.
+            removed = set(v2.split('\n'))
             s2[key] = ("\n".join(
                 [v for v in v1.split('\n')
-                   if v not in v2.split('\n')]), newnote)
+                   if v not in removed]), newnote)
             del s2[k]
 
     s1.update(s2)
@@ -1675,6 +3279,15 @@ Options:
     Squelch warnings about using an executable with a broken -S
     implementation.
 
+  --force
+
+    Do a full install run even if nothing changed since the last one.
+    When the buildout installed-fingerprint option names a file, runs
+    that aren't in newest mode and install the configured parts end
+    right away if the configuration, the installed-parts database, the
+    develop sources and the eggs directories are as the last such run
+    left them.
+
 Assignments are of the form: section:option=value and are used to
 provide configuration options that override those given in the
 configuration file.  For example, to run the buildout in offline mode,
@@ -1725,6 +3338,51 @@ Commands:
     sorted alphabetically, along with the origin of the value (file name or
     COMPUTED_VALUE, DEFAULT_VALUE, COMMAND_LINE_VALUE).
 
+  compile
+
+    Save the configuration, as read from the configuration files and
+    the user defaults, next to the configuration file.  Later runs use
+    it instead of reading the configuration files again, as long as
+    none of the files it was read from have changed.  Command-line
+    assignments aren't saved and are applied on every run.
+
+  plan [parts]
+
+    Print what install would do with the same arguments, without
+    running any recipes: the parts it would uninstall, with the reasons
+    why, and the parts it would install or update.  The recipes are
+    loaded, though, to compute the options and signatures of the parts.
+    When the buildout timing-history option names a file, the wall time
+    of each step is recorded there by install runs, and the plan shows
+    the median of the recorded times of each step and their total.
+    Parts installed in parallel may take less time than the total.
+
+  stats [parts]
+
+    Report the times recorded in the file named by the buildout
+    timing-history option: for loading the configuration and the
+    extensions, processing develop sources and installing, updating
+    and uninstalling each part.  Steps are listed slowest first, with
+    the number of times they were recorded, the median and latest wall
+    times, the latest CPU time, including that of subprocesses, the
+    number of files installed and the change in median time between the
+    older and newer half of the records.  Steps that took much longer
+    the last time than they usually do are listed as regressions.  If
+    no command arguments are given, all the parts are reported on,
+    otherwise the parts given are.
+
+  verify [parts]
+
+    Compare the files installed by parts with the manifests recorded
+    when the parts were installed or updated, and list the files that
+    changed, went missing or were added.  The manifests are recorded
+    in the file named by the buildout installed-manifest option.  They
+    hold the sizes and modification times of the files, and also MD5
+    checksums when the installed-manifest-hash option is true, in
+    which case files only count as changed if their sizes or contents
+    did.  If no command arguments are given, all installed parts are
+    verified.
+
 """
 def _help():
     print _usage
@@ -1741,6 +3399,7 @@ def main(args=None):
     user_defaults = True
     debug = False
     ignore_broken_dash_s = False
+    force = False
     while args:
         if args[0][0] == '-':
             op = orig_op = args.pop(0)
@@ -1797,7 +3456,10 @@ def main(args=None):
             elif op:
                 if orig_op == '--help':
                     _help()
-                _error("Invalid option", '-'+op[0])
+                elif orig_op == '--force':
+                    force = True
+                else:
+                    _error("Invalid option", '-'+op[0])
         elif '=' in args[0]:
             option, value = args.pop(0).split('=', 1)
             if len(option.split(':')) != 2:
@@ -1827,7 +3489,7 @@ def main(args=None):
         command = args.pop(0)
         if command not in (
             'install', 'bootstrap', 'runsetup', 'setup', 'init',
-            'annotate',
+            'annotate', 'compile', 'verify', 'plan', 'stats',
             ):
             _error('invalid command:', command)
     else:
@@ -1837,7 +3499,7 @@ def main(args=None):
         try:
             buildout = Buildout(config_file, options,
                                 user_defaults, windows_restart,
-                                command, args)
+                                command, args, force)
             getattr(buildout, command)(args)
         except Exception, v:
             _doing()
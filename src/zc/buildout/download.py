@@ -27,6 +27,7 @@ import tempfile
 import urllib
 import urlparse
 import zc.buildout
+import zc.buildout.filehash
 
 
 class URLOpener(urllib.FancyURLopener):
@@ -232,16 +233,9 @@ def check_md5sum(path, md5sum):
     if md5sum is None:
         return True
 
-    f = open(path, 'rb')
     checksum = md5()
-    try:
-        chunk = f.read(2**16)
-        while chunk:
-            checksum.update(chunk)
-            chunk = f.read(2**16)
-        return checksum.hexdigest() == md5sum
-    finally:
-        f.close()
+    zc.buildout.filehash.update_hash(checksum, [path])
+    return checksum.hexdigest() == md5sum
 
 
 def remove(path):
@@ -18,6 +18,7 @@ It doesn't install scripts.  It uses setuptools and requires it to be
 installed.
 """
 
+import collections
 import distutils.errors
 import fnmatch
 import glob
@@ -33,8 +34,11 @@ import shutil
 import subprocess
 import sys
 import tempfile
+import threading
 import warnings
 import zc.buildout
+import zc.buildout.eggmanifest
+import zc.buildout.rmtree
 import zipimport
 
 _oprp = getattr(os.path, 'realpath', lambda path: path)
@@ -320,6 +324,7 @@ class Installer:
     _always_unzip = False
     _include_site_packages = True
     _allowed_eggs_from_site_packages = ('*',)
+    _use_eggs_manifest = False
 
     def __init__(self,
                  dest=None,
@@ -395,8 +400,13 @@ class Installer:
         if self._dest is None:
             newest = False
         self._newest = newest
-        self._env = pkg_resources.Environment(path,
-                                              python=_get_version(executable))
+        if self._use_eggs_manifest:
+            # See zc.buildout.eggmanifest.
+            self._env = zc.buildout.eggmanifest.environment(
+                path, _get_version(executable), create=(dest, ))
+        else:
+            self._env = pkg_resources.Environment(
+                path, python=_get_version(executable))
         self._index = _get_index(executable, index, links, self._allow_hosts,
                                  self._path)
 
@@ -526,13 +536,20 @@ class Installer:
         return best_we_have, None
 
     def _load_dist(self, dist):
-        dists = pkg_resources.Environment(
-            dist.location,
-            python=_get_version(self._executable),
-            )[dist.project_name]
+        dists = self._installed(dist.location, dist.project_name)
         assert len(dists) == 1
         return dists[0]
 
+    def _installed(self, location, project_name):
+        # Return the distributions of a project just installed at location,
+        # an egg.  Getting them this way causes the distribution meta data
+        # to be read, like getting them from a pkg_resources.Environment of
+        # the location, but we don't make an environment for each.
+        key = project_name.lower()
+        return [dist for dist in pkg_resources.find_distributions(location)
+                if dist.key == key and self._env.can_add(dist)
+                and dist.has_version()]
+
     def _call_easy_install(self, spec, ws, dest, dist):
 
         tmp = tempfile.mkdtemp(dir=dest)
@@ -615,22 +632,19 @@ class Installer:
                 newloc = os.path.join(dest, os.path.basename(d.location))
                 if os.path.exists(newloc):
                     if os.path.isdir(newloc):
-                        shutil.rmtree(newloc)
+                        zc.buildout.rmtree.rmtree(newloc)
                     else:
                         os.remove(newloc)
                 os.rename(d.location, newloc)
 
-                [d] = pkg_resources.Environment(
-                    [newloc],
-                    python=_get_version(self._executable),
-                    )[d.project_name]
+                [d] = self._installed(newloc, d.project_name)
 
                 result.append(d)
 
             return result
 
         finally:
-            shutil.rmtree(tmp)
+            zc.buildout.rmtree.rmtree(tmp)
 
     def _obtain(self, requirement, source=None):
         # initialize out index for this project:
@@ -777,13 +791,10 @@ class Installer:
 
                     redo_pyc(newloc)
 
-                    # Getting the dist from the environment causes the
+                    # Getting the dist from the location causes the
                     # distribution meta data to be read.  Cloning isn't
                     # good enough.
-                    dists = pkg_resources.Environment(
-                        [newloc],
-                        python=_get_version(self._executable),
-                        )[dist.project_name]
+                    dists = self._installed(newloc, dist.project_name)
                 else:
                     # It's some other kind of dist.  We'll let easy_install
                     # deal with it:
@@ -794,9 +805,16 @@ class Installer:
 
             finally:
                 if tmp != self._download_cache:
-                    shutil.rmtree(tmp)
+                    zc.buildout.rmtree.rmtree(tmp)
 
-            self._env.scan([self._dest])
+            # Add what we installed to the environment, rather than
+            # scanning the destination, which may have thousands of
+            # distributions, again.
+            for d in dists:
+                self._env.add(d)
+            if self._use_eggs_manifest:
+                zc.buildout.eggmanifest.distributions(
+                    self._dest, installed=dists)
             dist = self._env.best_match(requirement, ws)
             logger.info("Got %s.", dist)
 
@@ -882,16 +900,27 @@ class Installer:
         if destination is not None and destination not in path:
             path.insert(0, destination)
 
-        requirements = [self._constrain(pkg_resources.Requirement.parse(spec))
-                        for spec in specs]
-
-
-
         if working_set is None:
             ws = pkg_resources.WorkingSet([])
         else:
             ws = working_set
 
+        self._select(specs, ws)
+        if self._use_eggs_manifest:
+            zc.buildout.eggmanifest.save_metadata()
+        return ws
+
+    def _select(self, specs, ws):
+        """Add the distributions for specs and their requirements to ws.
+
+        Distributions are gotten with _get_dist for the specs and with
+        _get_required for the distributions they require.  zc.recipe.egg
+        overrides these to select from distributions it got before, the
+        way install would.
+        """
+        requirements = [self._constrain(pkg_resources.Requirement.parse(spec))
+                        for spec in specs]
+
         for requirement in requirements:
             for dist in self._get_dist(requirement, ws, self._always_unzip):
                 ws.add(dist)
@@ -899,21 +928,49 @@ class Installer:
 
         # OK, we have the requested distributions and they're in the working
         # set, but they may have unmet requirements.  We'll resolve these
-        # requirements. This is code modified from
-        # pkg_resources.WorkingSet.resolve.  We can't reuse that code directly
-        # because we have to constrain our requirements (see
-        # versions_section_ignored_for_dependency_in_favor_of_site_packages in
-        # zc.buildout.tests).
-        requirements.reverse() # Set up the stack.
+        # requirements.
+        self._resolve(requirements, ws)
+
+    def _get_required(self, req, ws):
+        # Get the distributions for a requirement of a distribution.
+        if self._dest:
+            logger.debug('Getting required %r', str(req))
+        else:
+            logger.debug('Adding required %r', str(req))
+        _log_requirement(ws, req)
+        return self._get_dist(req, ws, self._always_unzip)
+
+    def _resolve(self, requirements, ws):
+        """Add the distributions required by requirements to a working set.
+
+        This is code modified from pkg_resources.WorkingSet.resolve.  We
+        can't reuse that code directly because we have to constrain our
+        requirements (see
+        versions_section_ignored_for_dependency_in_favor_of_site_packages
+        in zc.buildout.tests).  Requirements are processed breadth-first,
+        in the reverse of the given order.  Each distinct requirement is
+        constrained only once, and the requirements of a distribution are
+        looked up once for each set of extras.
+        """
+        queue = collections.deque(requirements[::-1])
+        constrained = {}  # This maps requirements to constrained ones.
+        requires = {}  # This maps dists and extras to their requirements.
         processed = {}  # This is a set of processed requirements.
         best = {}  # This is a mapping of key -> dist.
         # Note that we don't use the existing environment, because we want
         # to look for new eggs unless what we have is the best that
-        # matches the requirement.
-        env = pkg_resources.Environment(ws.entries)
-        while requirements:
-            # Process dependencies breadth-first.
-            req = self._constrain(requirements.pop(0))
+        # matches the requirement.  Eggs in the working set only hold the
+        # distributions already there, so they aren't opened again, which
+        # the eggs-manifest option saves them from.
+        env = pkg_resources.Environment(
+            [entry for entry in ws.entries
+             if not (entry.lower().endswith('.egg')
+                     and ws.entry_keys.get(entry))])
+        while queue:
+            requirement = queue.popleft()
+            req = constrained.get(requirement)
+            if req is None:
+                req = constrained[requirement] = self._constrain(requirement)
             if req in processed:
                 # Ignore cyclic or redundant dependencies.
                 continue
@@ -933,24 +990,20 @@ class Installer:
                         # environment, or what we found is from site
                         # packages and not allowed to be there, try
                         # again.
-                        if destination:
-                            logger.debug('Getting required %r', str(req))
-                        else:
-                            logger.debug('Adding required %r', str(req))
-                        _log_requirement(ws, req)
-                        for dist in self._get_dist(req,
-                                                   ws, self._always_unzip):
+                        for dist in self._get_required(req, ws):
                             ws.add(dist)
                             self._maybe_add_setuptools(ws, dist)
             if dist not in req:
                 # Oops, the "best" so far conflicts with a dependency.
                 raise VersionConflict(
                     pkg_resources.VersionConflict(dist, req), ws)
-            requirements.extend(dist.requires(req.extras)[::-1])
+            key = dist, req.extras
+            if key not in requires:
+                requires[key] = dist.requires(req.extras)[::-1]
+            queue.extend(requires[key])
             processed[req] = True
             if dist.location in self._site_packages:
                 logger.debug('Egg from site-packages: %s', dist)
-        return ws
 
     def build(self, spec, build_ext):
 
@@ -1012,11 +1065,11 @@ class Installer:
 
                 return [dist.location for dist in dists]
             finally:
-                shutil.rmtree(build_tmp)
+                zc.buildout.rmtree.rmtree(build_tmp)
 
         finally:
             if tmp != self._download_cache:
-                shutil.rmtree(tmp)
+                zc.buildout.rmtree.rmtree(tmp)
 
 def default_versions(versions=None):
     old = Installer._versions
@@ -1074,6 +1127,17 @@ def always_unzip(setting=None):
         Installer._always_unzip = bool(setting)
     return old
 
+def use_eggs_manifest(setting=None):
+    old = Installer._use_eggs_manifest
+    if setting is not None:
+        Installer._use_eggs_manifest = bool(setting)
+    return old
+
+# Installing distributions changes the eggs directories and the caches kept
+# here, so when the buildout installs parts in parallel (see the buildout
+# parallel-parts option), only one thread at a time installs them.
+_install_lock = threading.RLock()
+
 def install(specs, dest,
             links=(), index=None,
             executable=sys.executable, always_unzip=None,
@@ -1081,13 +1145,17 @@ def install(specs, dest,
             use_dependency_links=None, allow_hosts=('*',),
             include_site_packages=None, allowed_eggs_from_site_packages=None,
             prefer_final=None):
-    installer = Installer(
-        dest, links, index, executable, always_unzip, path, newest,
-        versions, use_dependency_links, allow_hosts=allow_hosts,
-        include_site_packages=include_site_packages,
-        allowed_eggs_from_site_packages=allowed_eggs_from_site_packages,
-        prefer_final=prefer_final)
-    return installer.install(specs, working_set)
+    _install_lock.acquire()
+    try:
+        installer = Installer(
+            dest, links, index, executable, always_unzip, path, newest,
+            versions, use_dependency_links, allow_hosts=allow_hosts,
+            include_site_packages=include_site_packages,
+            allowed_eggs_from_site_packages=allowed_eggs_from_site_packages,
+            prefer_final=prefer_final)
+        return installer.install(specs, working_set)
+    finally:
+        _install_lock.release()
 
 
 def build(spec, dest, build_ext,
@@ -1095,19 +1163,23 @@ def build(spec, dest, build_ext,
           executable=sys.executable,
           path=None, newest=True, versions=None, allow_hosts=('*',),
           include_site_packages=None, allowed_eggs_from_site_packages=None):
-    installer = Installer(
-        dest, links, index, executable, True, path, newest, versions,
-        allow_hosts=allow_hosts,
-        include_site_packages=include_site_packages,
-        allowed_eggs_from_site_packages=allowed_eggs_from_site_packages)
-    return installer.build(spec, build_ext)
+    _install_lock.acquire()
+    try:
+        installer = Installer(
+            dest, links, index, executable, True, path, newest, versions,
+            allow_hosts=allow_hosts,
+            include_site_packages=include_site_packages,
+            allowed_eggs_from_site_packages=allowed_eggs_from_site_packages)
+        return installer.build(spec, build_ext)
+    finally:
+        _install_lock.release()
 
 
 
 def _rm(*paths):
     for path in paths:
         if os.path.isdir(path):
-            shutil.rmtree(path)
+            zc.buildout.rmtree.rmtree(path)
         elif os.path.exists(path):
             os.remove(path)
 
@@ -1165,7 +1237,7 @@ def develop(setup, dest,
             ))
 
         tmp3 = tempfile.mkdtemp('build', dir=dest)
-        undo.append(lambda : shutil.rmtree(tmp3))
+        undo.append(lambda : zc.buildout.rmtree.rmtree(tmp3))
 
         args = [
             zc.buildout.easy_install._safe_arg(tsetup),
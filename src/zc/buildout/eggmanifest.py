@@ -0,0 +1,420 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Manifests of the distributions in eggs directories
+
+Finding the distributions in a directory with pkg_resources opens every
+egg in it, which takes seconds for directories of thousands of eggs.  A
+manifest kept in an eggs directory records the project, version, Python
+version, platform and precedence of the distributions of each egg, so
+that they can be found without opening the eggs.  An egg's meta data is
+read when it's first used.
+
+The manifest is kept in a subdirectory, so that writing it doesn't change
+the modification time of the eggs directory.  When the eggs directory
+hasn't been modified since the manifest was written, the manifest is used
+as it is.  Otherwise, the directory is listed and only the eggs that
+aren't in the manifest are opened.
+
+The meta data that's read to resolve requirements and generate scripts
+(see cached_metadata) is cached in another file next to the manifest,
+keyed by the location, size and modification time of each egg, so that
+the eggs don't have to be opened to read it again.  It's written by
+save_metadata.
+
+    >>> import tempfile, zipfile
+    >>> from zc.buildout.rmtree import rmtree
+    >>> eggs = tempfile.mkdtemp()
+    >>> def egg(name, requires=''):
+    ...     zf = zipfile.ZipFile(os.path.join(eggs, name), 'w')
+    ...     zf.writestr('EGG-INFO/PKG-INFO', 'Metadata-Version: 1.0\\n')
+    ...     zf.writestr('EGG-INFO/requires.txt', requires)
+    ...     zf.close()
+    >>> egg('demo-1.0-py2.4.egg', 'demoneeded')
+    >>> egg('demoneeded-1.1-py2.4.egg')
+
+Directories get manifests when they're asked to:
+
+    >>> distributions(eggs)
+    >>> dists = distributions(eggs, create=True)
+    >>> sorted(map(str, dists))
+    ['demo 1.0', 'demoneeded 1.1']
+    >>> os.listdir(os.path.join(eggs, '.manifest'))
+    ['eggs']
+
+Once they have one, it's used:
+
+    >>> dists = distributions(eggs)
+    >>> sorted(map(str, dists))
+    ['demo 1.0', 'demoneeded 1.1']
+    >>> dists.sort(key=str)
+    >>> [(dist.py_version, dist.platform, dist.precedence) for dist in dists]
+    [('2.4', None, 3), ('2.4', None, 3)]
+    >>> [map(str, dist.requires()) for dist in dists]
+    [['demoneeded'], []]
+
+Their meta data is cached once it's saved:
+
+    >>> save_metadata()
+    >>> sorted(os.listdir(os.path.join(eggs, '.manifest')))
+    ['eggs', 'metadata']
+    >>> _metadata.clear()
+    >>> dists = sorted(distributions(eggs), key=str)
+    >>> demo = dists[0]
+    >>> map(str, demo.requires())
+    ['demoneeded']
+    >>> demo._provider._provider is None
+    True
+
+So the egg wasn't opened.  Meta data that isn't cached is read from the
+egg:
+
+    >>> demo.has_metadata('PKG-INFO')
+    True
+    >>> demo._provider._provider is None
+    False
+
+The cached meta data of an egg that changed isn't used:
+
+    >>> past = time.time() - 10
+    >>> os.utime(os.path.join(eggs, 'demo-1.0-py2.4.egg'), (past, past))
+    >>> demo = sorted(distributions(eggs), key=str)[0]
+    >>> map(str, demo.requires())
+    ['demoneeded']
+    >>> demo._provider._provider is None
+    False
+
+Eggs added to the directory are found, and eggs removed from it are
+forgotten:
+
+    >>> egg('other-1.0-py2.4.egg')
+    >>> os.remove(os.path.join(eggs, 'demo-1.0-py2.4.egg'))
+    >>> sorted(map(str, distributions(eggs)))
+    ['demoneeded 1.1', 'other 1.0']
+
+Distributions that were just installed are recorded without opening
+them:
+
+    >>> egg('demo-2.0-py2.4.egg')
+    >>> installed = pkg_resources.Distribution(
+    ...     os.path.join(eggs, 'demo-2.0-py2.4.egg'), project_name='demo',
+    ...     version='2.0', py_version='2.4')
+    >>> sorted(map(str, distributions(eggs, installed=[installed])))
+    ['demo 2.0', 'demoneeded 1.1', 'other 1.0']
+
+Directories with develop eggs, which are found differently, don't get
+manifests:
+
+    >>> develop = tempfile.mkdtemp()
+    >>> open(os.path.join(develop, 'demo.egg-link'), 'w').write(eggs)
+    >>> distributions(develop, create=True)
+
+An environment uses manifests where there are some, and scans the other
+directories:
+
+    >>> env = environment([eggs, develop], None)
+    >>> map(str, env['demo'])
+    ['demo 2.0']
+    >>> map(str, env['demoneeded'])
+    ['demoneeded 1.1']
+
+    >>> rmtree(eggs)
+    >>> rmtree(develop)
+"""
+
+import doctest
+import marshal
+import os
+import tempfile
+import threading
+import time
+
+import pkg_resources
+
+# Where the manifest of an eggs directory is kept, relative to it.
+manifest_name = os.path.join('.manifest', 'eggs')
+
+# Directories with entries like these are found differently than
+# directories of eggs, so they don't get manifests.
+_develop_suffixes = '.egg-link', '.egg-info', '.dist-info'
+
+# Where the meta data read from the eggs of an eggs directory is cached,
+# and the meta data that's cached.
+metadata_name = os.path.join('.manifest', 'metadata')
+cached_metadata = ('requires.txt', 'depends.txt', 'dependency_links.txt',
+                   'namespace_packages.txt', 'entry_points.txt')
+
+# The cached meta data of the eggs directories used in this process, which
+# maps egg locations relative to the directories to their sizes,
+# modification times and meta data, and the directories whose cached meta
+# data changed since it was saved.  Parts may be installed in threads, so
+# they're changed with the lock held.
+_metadata = {}
+_changed_metadata = set()
+_metadata_lock = threading.Lock()
+
+def environment(path, python, create=()):
+    """Return a pkg_resources.Environment of the distributions in path.
+
+    Manifests are used for directories that have them, and made for the
+    directories in create.
+    """
+    env = pkg_resources.Environment([], python=python)
+    for item in path:
+        dists = distributions(item, item in create)
+        if dists is None:
+            env.scan([item])
+        else:
+            for dist in dists:
+                env.add(dist)
+    return env
+
+def distributions(directory, create=False, installed=()):
+    """Return the distributions in an eggs directory, using its manifest.
+
+    The manifest is brought up to date.  installed are distributions that
+    were just installed in the directory, which don't have to be opened.
+    Returns None if the directory doesn't have a manifest and create is
+    false, or if it isn't a directory of eggs.
+    """
+    path = os.path.join(directory, manifest_name)
+    manifest = _load(path)
+    if manifest is None:
+        if not (create and os.path.isdir(directory)):
+            return None
+        if not os.path.isdir(os.path.dirname(path)):
+            try:
+                os.mkdir(os.path.dirname(path))
+            except OSError:
+                return None
+    try:
+        mtime = os.stat(directory).st_mtime
+    except OSError:
+        return None
+
+    if manifest is not None:
+        recorded, written, entries = manifest
+        # A directory modified in the second the manifest was written may
+        # have been modified again since, without a change of modification
+        # time, so the manifest is only used as it is if the directory was
+        # modified earlier.
+        if recorded == mtime and recorded < written - 1 and not installed:
+            return _distributions(directory, entries)
+    else:
+        recorded = None
+        entries = {}
+
+    records = {}
+    for dist in installed:
+        name = _relative(directory, dist.location).split(os.path.sep)[0]
+        records.setdefault(name, []).append(_record(directory, dist))
+
+    found = {}
+    for name in os.listdir(directory):
+        lower = name.lower()
+        if lower.endswith(_develop_suffixes):
+            return None
+        if not lower.endswith('.egg'):
+            continue
+        if name in records:
+            found[name] = records[name]
+        elif name in entries:
+            found[name] = entries[name]
+        else:
+            found[name] = [
+                _record(directory, dist)
+                for dist in pkg_resources.find_distributions(
+                    os.path.join(directory, name))
+                ]
+
+    if found != entries or recorded != mtime or not recorded < written - 1:
+        _save(path, (mtime, time.time(), found))
+    return _distributions(directory, found)
+
+def _relative(directory, location):
+    return location[len(os.path.join(directory, '')):]
+
+def _record(directory, dist):
+    return (_relative(directory, dist.location), dist.project_name,
+            dist.version, dist.py_version, dist.platform, dist.precedence)
+
+def _distributions(directory, entries):
+    result = []
+    for name, records in entries.items():
+        egg = os.path.join(directory, name)
+        for (location, project_name, version, py_version, platform,
+             precedence) in records:
+            location = os.path.join(directory, location)
+            result.append(pkg_resources.Distribution(
+                location, _Metadata(directory, egg, location),
+                project_name=project_name, version=version,
+                py_version=py_version, platform=platform,
+                precedence=precedence))
+    return result
+
+class _Metadata:
+    """The meta data of a distribution, read when it's first used
+
+    The meta data named in cached_metadata is cached.
+    """
+
+    def __init__(self, directory, egg, location):
+        self._directory = directory
+        self._egg = egg
+        self._location = location
+        self._provider = None
+        self._cached = None
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self._get_provider(), name)
+
+    def _get_provider(self):
+        if self._provider is None:
+            self._provider = pkg_resources.empty_provider
+            for dist in pkg_resources.find_distributions(self._egg):
+                if dist.location == self._location:
+                    self._provider = dist._provider
+                    break
+        return self._provider
+
+    def _get_cached(self, name):
+        # Return the cached meta data with the given name, None if the
+        # distribution doesn't have it.
+        if self._cached is None:
+            try:
+                st = os.stat(self._egg)
+            except OSError:
+                return self._read(name)
+            key = st.st_size, st.st_mtime
+            relative = _relative(self._directory, self._location)
+            _metadata_lock.acquire()
+            try:
+                cache = _metadata.get(self._directory)
+                if cache is None:
+                    cache = _metadata[self._directory] = _load_metadata(
+                        os.path.join(self._directory, metadata_name))
+                cached = cache.get(relative)
+                if cached is None or cached[:2] != key:
+                    cached = cache[relative] = key + ({}, )
+                self._cached = cached[2]
+            finally:
+                _metadata_lock.release()
+        try:
+            return self._cached[name]
+        except KeyError:
+            pass
+        text = self._read(name)
+        _metadata_lock.acquire()
+        try:
+            self._cached[name] = text
+            _changed_metadata.add(self._directory)
+        finally:
+            _metadata_lock.release()
+        return text
+
+    def _read(self, name):
+        provider = self._get_provider()
+        if provider.has_metadata(name):
+            return provider.get_metadata(name)
+        return None
+
+    def has_metadata(self, name):
+        if name in cached_metadata:
+            return self._get_cached(name) is not None
+        return self._get_provider().has_metadata(name)
+
+    def get_metadata(self, name):
+        if name in cached_metadata:
+            text = self._get_cached(name)
+            if text is not None:
+                return text
+        return self._get_provider().get_metadata(name)
+
+    def get_metadata_lines(self, name):
+        return pkg_resources.yield_lines(self.get_metadata(name))
+
+def save_metadata():
+    """Save the meta data read from eggs since it was last saved.
+
+    What other processes saved in the meantime is kept, and the meta data
+    of eggs that were removed is dropped.
+    """
+    _metadata_lock.acquire()
+    try:
+        for directory in _changed_metadata:
+            path = os.path.join(directory, metadata_name)
+            try:
+                names = set(os.listdir(directory))
+            except OSError:
+                continue
+            cache = _load_metadata(path)
+            cache.update(_metadata[directory])
+            for location in list(cache):
+                if location.split(os.path.sep)[0] not in names:
+                    del cache[location]
+            _save(path, cache)
+            _metadata[directory] = cache
+        _changed_metadata.clear()
+    finally:
+        _metadata_lock.release()
+
+def _load_marshalled(path):
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        return None
+    try:
+        try:
+            return marshal.load(f)
+        except (EOFError, ValueError, TypeError):
+            return None
+    finally:
+        f.close()
+
+def _load(path):
+    manifest = _load_marshalled(path)
+    if not (isinstance(manifest, tuple) and len(manifest) == 3):
+        return None
+    return manifest
+
+def _load_metadata(path):
+    cache = _load_marshalled(path)
+    if not isinstance(cache, dict):
+        return {}
+    return cache
+
+def _save(path, data):
+    # Files are replaced by a rename, so they're never seen half written.
+    # Eggs directories may be shared and read-only, in which case they
+    # just don't get a manifest.
+    try:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    except OSError:
+        return
+    try:
+        os.write(fd, marshal.dumps(data))
+    finally:
+        os.close(fd)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # Windows won't rename over an existing file.
+        os.remove(tmp)
+
+def test_suite():
+    return doctest.DocTestSuite()
+
+if "__main__" == __name__:
+    doctest.testmod()
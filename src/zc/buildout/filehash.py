@@ -0,0 +1,234 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Hashing the contents of files
+"""
+
+import doctest
+import mmap
+import os
+import sys
+import threading
+
+# The number of threads reading files ahead of the hash, the number of
+# files they may read ahead, and the size from which files are mapped into
+# memory rather than read.
+read_threads = 8
+read_ahead = 64
+mmap_size = 1 << 20
+
+chunk_size = 1 << 16
+
+def update_hash(hash, filenames, mode='rb'):
+    """Update a hash with the contents of files, in the order given.
+
+    This is done as if the files were read one after the other, but
+    they're read ahead by several threads while the hash is updated.  The
+    hash functions of hashlib don't hold the interpreter lock while they
+    work on large strings, and neither does reading files.  Large files
+    are mapped into memory rather than read.
+
+    >>> from tempfile import mkdtemp
+    >>> import shutil
+    >>> try:
+    ...     from hashlib import md5
+    ... except ImportError:
+    ...     from md5 import md5
+
+    Let's make some files, one of them large enough to be mapped into
+    memory:
+
+    >>> d = mkdtemp()
+    >>> filenames = []
+    >>> for i in range(100):
+    ...     filename = os.path.join(d, str(i))
+    ...     if i == 50:
+    ...         data = 'x' * (mmap_size + 1)
+    ...     else:
+    ...         data = 'file %s' % i
+    ...     open(filename, 'w').write(data)
+    ...     filenames.append(filename)
+
+    The hash is the same as that of the contents of the files read one
+    after the other:
+
+    >>> expected = md5()
+    >>> for filename in filenames:
+    ...     expected.update(open(filename).read())
+    >>> hash = md5()
+    >>> update_hash(hash, filenames)
+    >>> hash.hexdigest() == expected.hexdigest()
+    True
+
+    Errors reading a file are raised when the hash gets to it:
+
+    >>> hash = md5()
+    >>> update_hash(hash, filenames[:10] + [os.path.join(d, 'nonexistent')]
+    ...             + filenames[10:])
+    Traceback (most recent call last):
+    ...
+    IOError: [Errno 2] No such file or directory: '...nonexistent'
+
+    To hash other data between the contents of the files, use a Reader,
+    which updates a hash with the contents of the next file each time
+    it's asked to:
+
+    >>> expected = md5()
+    >>> for filename in filenames:
+    ...     expected.update(filename)
+    ...     expected.update(open(filename).read())
+    >>> hash = md5()
+    >>> reader = Reader(filenames)
+    >>> try:
+    ...     for filename in filenames:
+    ...         hash.update(filename)
+    ...         reader.update(hash)
+    ... finally:
+    ...     reader.close()
+    >>> hash.hexdigest() == expected.hexdigest()
+    True
+
+    >>> shutil.rmtree(d)
+    """
+    reader = Reader(filenames, mode)
+    try:
+        for i in range(len(reader.filenames)):
+            reader.update(hash)
+    finally:
+        reader.close()
+
+class Reader:
+    """Read files in order for hashing, ahead of time in threads.
+
+    The reader must be closed when it isn't needed anymore, which stops
+    the threads.
+    """
+
+    def __init__(self, filenames, mode='rb'):
+        self.filenames = list(filenames)
+        self.mode = mode
+        self._next = 0
+        self._contents = {}
+        self._todo = range(len(self.filenames))
+        self._todo.reverse()
+        self._ready = threading.Condition()
+        self._window = threading.Semaphore(read_ahead)
+        self._threads = []
+        if read_threads > 1 and len(self.filenames) > 1:
+            self._threads = [
+                threading.Thread(target=self._read)
+                for i in range(min(len(self.filenames), read_threads))]
+            for thread in self._threads:
+                thread.setDaemon(True)
+                thread.start()
+
+    def _read(self):
+        while True:
+            self._window.acquire()
+            self._ready.acquire()
+            try:
+                if not self._todo:
+                    return
+                i = self._todo.pop()
+            finally:
+                self._ready.release()
+            try:
+                data = _read(self.filenames[i], self.mode), None
+            except:
+                data = None, sys.exc_info()
+            self._ready.acquire()
+            try:
+                self._contents[i] = data
+                self._ready.notifyAll()
+            finally:
+                self._ready.release()
+
+    def update(self, hash):
+        """Update a hash with the contents of the next file.
+        """
+        i = self._next
+        self._next += 1
+        filename = self.filenames[i]
+        if not self._threads:
+            _update(hash, filename, _read(filename, self.mode))
+            return
+
+        self._ready.acquire()
+        try:
+            while i not in self._contents:
+                self._ready.wait()
+            data, exc_info = self._contents.pop(i)
+        finally:
+            self._ready.release()
+        self._window.release()
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        _update(hash, filename, data)
+
+    def close(self):
+        # Stop the threads, including those waiting for room to read ahead.
+        self._ready.acquire()
+        try:
+            del self._todo[:]
+        finally:
+            self._ready.release()
+        for thread in self._threads:
+            self._window.release()
+        for thread in self._threads:
+            thread.join()
+        for data, exc_info in self._contents.values():
+            if isinstance(data, mmap.mmap):
+                data.close()
+        self._contents.clear()
+
+def _read(filename, mode):
+    # Return the contents of a file as a string or a memory map, or None
+    # if a large file couldn't be mapped and has to be read in chunks.
+    # Text mode may change what's read on some platforms, where we don't
+    # map files.
+    f = open(filename, mode)
+    try:
+        if mode == 'rb' or sys.platform != 'win32':
+            size = os.fstat(f.fileno()).st_size
+            if size >= mmap_size:
+                try:
+                    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (EnvironmentError, ValueError, OverflowError):
+                    return None
+        return f.read()
+    finally:
+        f.close()
+
+def _update(hash, filename, data):
+    if data is None:
+        f = open(filename, 'rb')
+        try:
+            chunk = f.read(chunk_size)
+            while chunk:
+                hash.update(chunk)
+                chunk = f.read(chunk_size)
+        finally:
+            f.close()
+    elif isinstance(data, mmap.mmap):
+        try:
+            hash.update(data)
+        finally:
+            data.close()
+    else:
+        hash.update(data)
+
+def test_suite():
+    return doctest.DocTestSuite(optionflags=doctest.ELLIPSIS)
+
+if "__main__" == __name__:
+    doctest.testmod()
@@ -16,6 +16,14 @@
 import shutil
 import os
 import doctest
+import sys
+import threading
+
+# The number of threads removing files, and the number of files from
+# which they're used.  Removing files is mostly waiting for the file
+# system, during which threads don't hold the interpreter lock.
+remove_threads = 8
+parallel_minimum = 1000
 
 def rmtree (path):
     """
@@ -52,15 +60,99 @@ def rmtree (path):
 
     >>> os.path.isdir (d)
     0
-    """
-    def retry_writeable (func, path, exc):
-        os.chmod (path, 0600)
-        func (path)
 
-    shutil.rmtree (path, onerror = retry_writeable)
+    Large trees are walked once, their files are removed by several
+    threads and then their directories, deepest first:
+
+    >>> d = mkdtemp()
+    >>> for i in range(parallel_minimum + 10):
+    ...     sub = os.path.join(d, str(i % 7), str(i % 3))
+    ...     if not os.path.isdir(sub):
+    ...         os.makedirs(sub)
+    ...     open(os.path.join(sub, str(i)), 'w').write('huhu')
+    >>> os.chmod(os.path.join(d, '0', '0', '0'), 0400)
+    >>> rmtree(d)
+    >>> os.path.isdir(d)
+    0
+
+    Errors are raised as they would be by shutil.rmtree, though after
+all the files that can be removed are:
+
+    >>> d = mkdtemp()
+    >>> for i in range(parallel_minimum):
+    ...     open(os.path.join(d, str(i)), 'w').write('huhu')
+    >>> os.mkdir(os.path.join(d, 'sub'))
+    >>> def fail(path):
+    ...     raise OSError(13, 'Permission denied', path)
+    >>> rmdir = os.rmdir
+    >>> os.rmdir = fail
+    >>> try:
+    ...     rmtree(d)
+    ... finally:
+    ...     os.rmdir = rmdir
+    Traceback (most recent call last):
+    ...
+    OSError: [Errno 13] Permission denied: '...sub'
+    >>> os.listdir(d)
+    ['sub']
+    >>> rmtree(d)
+
+    >>> rmtree(d)
+    Traceback (most recent call last):
+    ...
+    OSError: [Errno 2] No such file or directory: '...'
+    """
+    if os.path.islink(path) or not os.path.isdir(path):
+        # Let shutil.rmtree refuse to remove these.
+        shutil.rmtree(path)
+        return
+
+    files = []
+    directories = []
+    for (dirpath, dirnames, filenames) in os.walk(path):
+        directories.append(dirpath)
+        files.extend([os.path.join(dirpath, name) for name in filenames])
+        # Links to directories are listed as directories, but aren't
+        # walked.
+        files.extend([os.path.join(dirpath, name) for name in dirnames
+                      if os.path.islink(os.path.join(dirpath, name))])
+
+    if len(files) < parallel_minimum or remove_threads < 2:
+        for f in files:
+            _remove(os.remove, f)
+    else:
+        errors = []
+        threads = [threading.Thread(target=_remove_files,
+                                    args=(files[i::remove_threads], errors))
+                   for i in range(remove_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0][0], errors[0][1], errors[0][2]
+
+    directories.reverse()
+    for d in directories:
+        _remove(os.rmdir, d)
+
+def _remove(func, path):
+    # On windows, read-only files can't be removed.
+    try:
+        func(path)
+    except OSError:
+        os.chmod(path, 0600)
+        func(path)
+
+def _remove_files(files, errors):
+    try:
+        for f in files:
+            _remove(os.remove, f)
+    except:
+        errors.append(sys.exc_info())
 
 def test_suite():
-    return doctest.DocTestSuite()
+    return doctest.DocTestSuite(optionflags=doctest.ELLIPSIS)
 
 if "__main__" == __name__:
     doctest.testmod()
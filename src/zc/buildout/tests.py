@@ -3561,6 +3561,40 @@ def increment_buildout_with_multiple_extended_files_421022():
       recipe='zc.buildout:debug'
     """
 
+def decrement_keeps_order_of_remaining_lines():
+    r"""
+Removing lines with -= removes every occurrence of each line given and
+keeps the remaining lines in order:
+
+    >>> write('base.cfg', '''
+    ... [buildout]
+    ... parts = p
+    ...
+    ... [p]
+    ... recipe = zc.buildout:debug
+    ... eggs = e
+    ...        a
+    ...        d
+    ...        b
+    ...        a
+    ...        c
+    ... ''')
+    >>> write('buildout.cfg', '''
+    ... [buildout]
+    ... extends = base.cfg
+    ...
+    ... [p]
+    ... eggs -= a
+    ...         b
+    ...         x
+    ... ''')
+
+    >>> print system(buildout),
+    Installing p.
+      eggs='e\nd\nc'
+      recipe='zc.buildout:debug'
+    """
+
 def increment_on_command_line():
     r"""
     >>> write('buildout.cfg', '''
@@ -3587,6 +3621,1578 @@ def increment_on_command_line():
       recipe='zc.buildout:debug'
     """
 
+def substitutions_in_values_shared_by_sections():
+    r"""
+Values are split into text and references only once, even if they appear in
+several sections. References without a section name still refer to the
+section the value is used in, and escaped references are left alone:
+
+    >>> write('buildout.cfg', '''
+    ... [buildout]
+    ... parts = a b
+    ...
+    ... [a]
+    ... recipe = zc.buildout:debug
+    ... name = ${:_buildout_section_name_}
+    ... path = /srv/${:name} $${:name} ${buildout:parts}
+    ...
+    ... [b]
+    ... recipe = zc.buildout:debug
+    ... name = ${:_buildout_section_name_}
+    ... path = /srv/${:name} $${:name} ${buildout:parts}
+    ... ''')
+
+    >>> print system(buildout),
+    Installing a.
+      name='a'
+      path='/srv/a $${:name} a b'
+      recipe='zc.buildout:debug'
+    Installing b.
+      name='b'
+      path='/srv/b $${:name} a b'
+      recipe='zc.buildout:debug'
+    """
+
+def files_extended_more_than_once_are_read_once():
+    r"""
+When a configuration file is extended through several paths, it is only read
+and parsed once per run, but each path still gets its own copy of the data:
+
+    >>> write('base.cfg', '''
+    ... [buildout]
+    ... parts = p
+    ...
+    ... [p]
+    ... recipe = zc.buildout:debug
+    ... x = base
+    ... ''')
+    >>> write('a.cfg', '''
+    ... [buildout]
+    ... extends = base.cfg
+    ...
+    ... [p]
+    ... x += a
+    ... ''')
+    >>> write('b.cfg', '''
+    ... [buildout]
+    ... extends = base.cfg
+    ...
+    ... [p]
+    ... y = b
+    ... ''')
+    >>> write('buildout.cfg', '''
+    ... [buildout]
+    ... extends = a.cfg b.cfg
+    ... ''')
+
+    >>> print system(buildout+' -v'), # doctest: +ELLIPSIS
+    Configuration files were extended more than once; avoided parsing them 1 more times.
+    ...
+    Installing p.
+      recipe='zc.buildout:debug'
+      x='base'
+      y='b'
+    """
+
+def compiled_configuration():
+    r"""
+The compile command saves the configuration read from the configuration
+files, so that later runs don't need to read them again:
+
+    >>> write('base.cfg', '''
+    ... [buildout]
+    ... parts = p
+    ...
+    ... [p]
+    ... recipe = zc.buildout:debug
+    ... x = base
+    ... ''')
+    >>> write('buildout.cfg', '''
+    ... [buildout]
+    ... extends = base.cfg
+    ...
+    ... [p]
+    ... x += more
+    ... y = ${p:x}
+    ... ''')
+
+    >>> print system(buildout+' compile'),
+    Compiled configuration to /sample-buildout/.buildout.cfg.compiled.
+
+    >>> print system(buildout+' -v'), # doctest: +ELLIPSIS
+    Using compiled configuration /sample-buildout/.buildout.cfg.compiled.
+    ...
+    Installing p.
+      recipe='zc.buildout:debug'
+      x='base\nmore'
+      y='base\nmore'
+
+Substitutions are still made on every run, and command-line assignments
+aren't compiled in:
+
+    >>> print system(buildout+' p:x=cl'),
+    Uninstalling p.
+    Installing p.
+      recipe='zc.buildout:debug'
+      x='cl'
+      y='cl'
+
+When any of the files the configuration was read from changes, the
+compiled configuration isn't used any more:
+
+    >>> write('base.cfg', '''
+    ... [buildout]
+    ... parts = p
+    ...
+    ... [p]
+    ... recipe = zc.buildout:debug
+    ... x = changed base
+    ... ''')
+
+    >>> output = system(buildout+' -v')
+    >>> 'Using compiled configuration' in output
+    False
+    >>> print output[output.index('Uninstalling'):],
+    Uninstalling p.
+    Installing p.
+      recipe='zc.buildout:debug'
+      x='changed base\nmore'
+      y='changed base\nmore'
+    """
+
+def installed_fingerprint_skips_unchanged_runs():
+    r"""
+When the installed-fingerprint option names a file, buildout records there
+what a run installing the configured parts depended on:
+
+    >>> write('buildout.cfg', '''
+    ... [buildout]
+    ... installed-fingerprint = .installed.fingerprint
+    ... develop = recipes
+    ... parts = p
+    ...
+    ... [p]
+    ... recipe = zc.buildout:debug
+    ... x = 1
+    ... ''')
+    >>> mkdir('recipes')
+    >>> write('recipes', 'setup.py', '''
+    ... from setuptools import setup
+    ... setup(name='recipes')
+    ... ''')
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipes'
+    Installing p.
+      recipe='zc.buildout:debug'
+      x='1'
+
+    >>> os.path.exists('.installed.fingerprint')
+    True
+
+If nothing changed, later runs that don't look for newer distributions have
+nothing to do:
+
+    >>> print system(buildout+' -N'),
+    Nothing changed since the last run; nothing to do.
+
+Runs in newest mode, runs installing particular parts and runs with the
+--force option do the usual work:
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipes'
+    Updating p.
+      recipe='zc.buildout:debug'
+      x='1'
+
+    >>> print system(buildout+' -N install p'),
+    Develop: '/sample-buildout/recipes'
+    Updating p.
+      recipe='zc.buildout:debug'
+      x='1'
+
+    >>> print system(buildout+' -N --force'),
+    Develop: '/sample-buildout/recipes'
+    Updating p.
+      recipe='zc.buildout:debug'
+      x='1'
+
+    >>> print system(buildout+' -N'),
+    Nothing changed since the last run; nothing to do.
+
+Changing the configuration or the develop sources makes the next run do the
+usual work too:
+
+    >>> print system(buildout+' -N p:x=2'),
+    Develop: '/sample-buildout/recipes'
+    Uninstalling p.
+    Installing p.
+      recipe='zc.buildout:debug'
+      x='2'
+
+    >>> print system(buildout+' -N'),
+    Develop: '/sample-buildout/recipes'
+    Uninstalling p.
+    Installing p.
+      recipe='zc.buildout:debug'
+      x='1'
+
+    >>> write('recipes', 'README.txt', 'Some recipes.')
+    >>> print system(buildout+' -N'),
+    Develop: '/sample-buildout/recipes'
+    Updating p.
+      recipe='zc.buildout:debug'
+      x='1'
+
+    >>> print system(buildout+' -N'),
+    Nothing changed since the last run; nothing to do.
+
+So does removing files installed by the parts, which are installed again.
+To show this, we'll use a recipe that creates a directory:
+
+    >>> write('recipes', 'setup.py', '''
+    ... from setuptools import setup
+    ... setup(name='recipes',
+    ...       entry_points={'zc.buildout': ['mkdir = mkdir:Mkdir']})
+    ... ''')
+    >>> write('recipes', 'mkdir.py', '''
+    ... import os
+    ... class Mkdir:
+    ...     def __init__(self, buildout, name, options):
+    ...         self.path = os.path.join(
+    ...             buildout['buildout']['parts-directory'], name)
+    ...     def install(self):
+    ...         os.mkdir(self.path)
+    ...         return self.path
+    ...     def update(self):
+    ...         pass
+    ... ''')
+    >>> write('buildout.cfg', '''
+    ... [buildout]
+    ... installed-fingerprint = .installed.fingerprint
+    ... develop = recipes
+    ... parts = d
+    ...
+    ... [d]
+    ... recipe = recipes:mkdir
+    ... ''')
+
+    >>> print system(buildout+' -N'),
+    Develop: '/sample-buildout/recipes'
+    Uninstalling p.
+    Installing d.
+
+    >>> print system(buildout+' -N'),
+    Nothing changed since the last run; nothing to do.
+
+    >>> rmdir('parts', 'd')
+    >>> print system(buildout+' -N'),
+    Develop: '/sample-buildout/recipes'
+    Uninstalling d.
+    Installing d.
+
+    >>> ls('parts')
+    d  buildout
+    d  d
+
+    >>> print system(buildout+' -N'),
+    Nothing changed since the last run; nothing to do.
+    """
+
+def installed_parts_are_appended_to_installed_cfg():
+    r"""
+While parts are installed, .installed.cfg is updated by appending the
+sections of the parts installed, which replace earlier sections for the
+same parts, rather than by writing it out again each time:
+
+    >>> mkdir('recipe')
+    >>> write('recipe', 'setup.py',
+    ... '''
+    ... from setuptools import setup
+    ... setup(name='recipe',
+    ...       entry_points={'zc.buildout': ['default = recipe:Recipe']},
+    ...       )
+    ... ''')
+    >>> write('recipe', 'recipe.py',
+    ... '''
+    ... import zc.buildout
+    ... class Recipe:
+    ...     def __init__(self, buildout, name, options):
+    ...         self.options = options
+    ...         self.x = options.get('x')
+    ...     def install(self):
+    ...         if self.options.get('fail'):
+    ...             raise zc.buildout.UserError(self.options['fail'])
+    ...         return ()
+    ...     update = install
+    ... ''')
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a
+    ...
+    ... [a]
+    ... recipe = recipe
+    ... x = 1
+    ... ''')
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Installing a.
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a b
+    ...
+    ... [a]
+    ... recipe = recipe
+    ... x = 2
+    ...
+    ... [b]
+    ... recipe = recipe
+    ... fail = Oops.
+    ... ''')
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Uninstalling a.
+    Installing a.
+    Installing b.
+    While:
+      Installing b.
+    Error: Oops.
+
+    >>> cat('.installed.cfg') # doctest: +ELLIPSIS +NORMALIZE_WHITESPACE
+    [buildout]
+    installed_develop_eggs = /sample-buildout/develop-eggs/recipe.egg-link
+    parts = a
+    <BLANKLINE>
+    [a]
+    __buildout_installed__ =
+    __buildout_signature__ = recipe-...
+    recipe = recipe
+    x = 1
+    <BLANKLINE>
+    [buildout]
+    installed_develop_eggs = /sample-buildout/develop-eggs/recipe.egg-link
+    <BLANKLINE>
+    [buildout]
+    parts =
+    <BLANKLINE>
+    [a]
+    __buildout_installed__ =
+    __buildout_signature__ = recipe-...
+    recipe = recipe
+    x = 2
+    <BLANKLINE>
+    [buildout]
+    parts = a
+
+The part is up to date for the next run, which writes out the file again
+without the sections that were replaced once it's done:
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a b
+    ...
+    ... [a]
+    ... recipe = recipe
+    ... x = 2
+    ...
+    ... [b]
+    ... recipe = recipe
+    ... ''')
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Updating a.
+    Installing b.
+
+    >>> cat('.installed.cfg') # doctest: +ELLIPSIS +NORMALIZE_WHITESPACE
+    [buildout]
+    installed_develop_eggs = /sample-buildout/develop-eggs/recipe.egg-link
+    parts = a b
+    <BLANKLINE>
+    [a]
+    __buildout_installed__ =
+    __buildout_signature__ = recipe-...
+    recipe = recipe
+    x = 2
+    <BLANKLINE>
+    [b]
+    __buildout_installed__ =
+    __buildout_signature__ = recipe-...
+    recipe = recipe
+    """
+
+def parallel_parts():
+    r"""
+With the parallel-parts option, up to the given number of parts are
+installed at the same time.  Parts are installed in threads of the buildout
+process, so only parts whose recipes declare that they are parallel-safe,
+with a true parallel_safe attribute, are installed along with other parts.
+To show this, we'll use a recipe that can wait for a file created by
+another part:
+
+    >>> mkdir('recipe')
+    >>> write('recipe', 'setup.py',
+    ... '''
+    ... from setuptools import setup
+    ... setup(name='recipe',
+    ...       entry_points={'zc.buildout': ['default = recipe:Recipe',
+    ...                                     'cd = recipe:Cd']},
+    ...       )
+    ... ''')
+    >>> write('recipe', 'recipe.py',
+    ... '''
+    ... import os, time
+    ... import zc.buildout
+    ... class Recipe:
+    ...     parallel_safe = True
+    ...     def __init__(self, buildout, name, options):
+    ...         self.name = name
+    ...         self.options = options
+    ...     def install(self):
+    ...         wait_for = self.options.get('wait-for')
+    ...         if wait_for:
+    ...             deadline = time.time() + int(
+    ...                 self.options.get('timeout', '10'))
+    ...             while not os.path.exists(wait_for):
+    ...                 if time.time() > deadline:
+    ...                     raise zc.buildout.UserError(
+    ...                         "Gave up waiting for %s." % wait_for)
+    ...                 time.sleep(0.01)
+    ...         open(self.options['path'], 'w').write(self.name)
+    ...         if self.options.get('fail'):
+    ...             raise zc.buildout.UserError(self.options['fail'])
+    ...         return self.options['path']
+    ...     update = install
+    ... class Cd:
+    ...     def __init__(self, buildout, name, options):
+    ...         self.options = options
+    ...     def install(self):
+    ...         path = os.path.abspath(self.options['path'])
+    ...         os.mkdir(path)
+    ...         os.chdir(path)
+    ...         time.sleep(0.1)
+    ...         if os.getcwd() != path:
+    ...             raise zc.buildout.UserError("Lost the directory.")
+    ...         open('built', 'w').close()
+    ...         return path
+    ... ''')
+
+Parts are started in the usual order, as soon as the parts they depend on
+are done.  A part depends on the parts it refers to and on the parts named
+in its depends-on option:
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a b e c f
+    ... parallel-parts = 3
+    ...
+    ... [a]
+    ... recipe = recipe
+    ... path = a
+    ...
+    ... [b]
+    ... recipe = recipe
+    ... path = b
+    ... wait-for = c
+    ...
+    ... [c]
+    ... recipe = recipe
+    ... path = c
+    ...
+    ... [e]
+    ... recipe = recipe
+    ... path = e
+    ... depends-on = c
+    ...
+    ... [f]
+    ... recipe = recipe
+    ... path = ${e:path}-f
+    ... ''')
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Installing a.
+    Installing b.
+    Installing c.
+    Installing e.
+    Installing f.
+
+Part b waited for part c, which was listed after it, so installing them one
+at a time would have failed.
+
+    >>> ls('.') # doctest: +ELLIPSIS
+    -  .installed.cfg
+    -  a
+    -  b
+    d  bin
+    -  buildout.cfg
+    -  c
+    d  develop-eggs
+    -  e
+    -  e-f
+    ...
+
+When a part fails, no more parts are started.  The parts being installed at
+the time are finished and recorded, and the error is reported as usual.
+Here, part b writes its file before failing, and part a waits for it:
+
+    >>> remove('.installed.cfg')
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a b c
+    ... parallel-parts = 3
+    ...
+    ... [a]
+    ... recipe = recipe
+    ... path = a-waited
+    ... wait-for = b-failed
+    ...
+    ... [b]
+    ... recipe = recipe
+    ... path = b-failed
+    ... fail = Oops.
+    ...
+    ... [c]
+    ... recipe = recipe
+    ... path = ${b:path}-c
+    ... ''')
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Installing a.
+    Installing b.
+    While:
+      Installing b.
+    Error: Oops.
+
+    >>> cat('.installed.cfg') # doctest: +ELLIPSIS +NORMALIZE_WHITESPACE
+    [buildout]
+    installed_develop_eggs =
+    parts = a
+    <BLANKLINE>
+    [a]
+    __buildout_installed__ = a-waited
+    __buildout_signature__ = recipe-...
+    path = a-waited
+    recipe = recipe
+    wait-for = b-failed
+
+Other recipes may change the working directory, the environment, sys.path or
+other state shared by the process.  Parts using them are installed while no
+other part is being installed.  The Cd recipe changes into the directory it
+creates and checks that it is still there a bit later:
+
+    >>> remove('.installed.cfg')
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a d1 d2 d3
+    ... parallel-parts = 3
+    ...
+    ... [a]
+    ... recipe = recipe
+    ... path = a
+    ...
+    ... [d1]
+    ... recipe = recipe:cd
+    ... path = d1
+    ...
+    ... [d2]
+    ... recipe = recipe:cd
+    ... path = d2
+    ...
+    ... [d3]
+    ... recipe = recipe:cd
+    ... path = d3
+    ... ''')
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Installing a.
+    Installing d1.
+    Installing d2.
+    Installing d3.
+
+    >>> ls('d1')
+    -  built
+    >>> ls('d2')
+    -  built
+    >>> ls('d3')
+    -  built
+
+A part's parallel-safe option overrides what its recipe declares.  Here,
+part c isn't installed while part b is, so part b gives up waiting for it:
+
+    >>> remove('.installed.cfg')
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = b c
+    ... parallel-parts = 2
+    ...
+    ... [b]
+    ... recipe = recipe
+    ... path = b2
+    ... wait-for = c2
+    ... timeout = 1
+    ...
+    ... [c]
+    ... recipe = recipe
+    ... path = c2
+    ... parallel-safe = false
+    ... ''')
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Installing b.
+    While:
+      Installing b.
+    Error: Gave up waiting for c2.
+
+The option must be a positive number:
+
+    >>> print system(buildout+' buildout:parallel-parts=0'),
+    While:
+      Installing.
+    Error: Invalid value for parallel-parts option: 0
+    """
+
+def installed_manifests_and_verify():
+    r"""
+When the installed-manifest option names a file, buildout records there
+the sizes and modification times of the files installed by each part, and
+the verify command reports the installed files that changed since:
+
+    >>> mkdir('recipe')
+    >>> write('recipe', 'setup.py',
+    ... '''
+    ... from setuptools import setup
+    ... setup(name='recipe',
+    ...       entry_points={'zc.buildout': ['default = recipe:Recipe']},
+    ...       )
+    ... ''')
+    >>> write('recipe', 'recipe.py',
+    ... '''
+    ... import os
+    ... class Recipe:
+    ...     def __init__(self, buildout, name, options):
+    ...         self.options = options
+    ...         options['path'] = os.path.join(
+    ...             buildout['buildout']['parts-directory'], name)
+    ...     def install(self):
+    ...         path = self.options['path']
+    ...         os.mkdir(path)
+    ...         os.mkdir(os.path.join(path, 'sub'))
+    ...         open(os.path.join(path, 'a.txt'), 'w').write('aaa')
+    ...         open(os.path.join(path, 'sub', 'b.txt'), 'w').write('bbb')
+    ...         return path
+    ...     def update(self):
+    ...         pass
+    ... ''')
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = d
+    ... installed-manifest = .installed.manifest
+    ...
+    ... [d]
+    ... recipe = recipe
+    ... ''')
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Installing d.
+
+    >>> print system(buildout+' verify'),
+
+    >>> write('parts', 'd', 'a.txt', 'aaaa')
+    >>> remove('parts', 'd', 'sub', 'b.txt')
+    >>> write('parts', 'd', 'c.txt', 'ccc')
+    >>> print system(buildout+' verify'),
+    Part d:
+      changed /sample-buildout/parts/d/a.txt
+      added /sample-buildout/parts/d/c.txt
+      missing /sample-buildout/parts/d/sub/b.txt
+    Error: Installed files changed for parts: d
+
+Files that changed don't cause the part to be installed again, but the
+manifest is recorded again when the part is updated:
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Updating d.
+
+    >>> print system(buildout+' verify d'),
+
+With the installed-manifest-hash option, MD5 checksums of the files are
+recorded too, and files only count as changed if their sizes or contents
+did:
+
+    >>> print system(buildout+' buildout:installed-manifest-hash=true'),
+    Develop: '/sample-buildout/recipe'
+    Updating d.
+
+    >>> os.utime(join('parts', 'd', 'a.txt'), (0, 0))
+    >>> print system(buildout+' buildout:installed-manifest-hash=true verify'),
+
+    >>> write('parts', 'd', 'a.txt', 'bbbb')
+    >>> os.utime(join('parts', 'd', 'a.txt'), (0, 0))
+    >>> print system(buildout+' buildout:installed-manifest-hash=true verify'),
+    Part d:
+      changed /sample-buildout/parts/d/a.txt
+    Error: Installed files changed for parts: d
+
+Parts installed before the option was set have no manifest:
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = d
+    ...
+    ... [d]
+    ... recipe = recipe
+    ... x = 1
+    ... ''')
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Uninstalling d.
+    Installing d.
+
+    >>> print system(buildout+' buildout:installed-manifest=.installed.manifest'
+    ...              ' verify'),
+    No manifest was recorded for part d.
+
+    >>> print system(buildout+' verify'),
+    Error: The installed-manifest option isn't set.
+    >>> print system(buildout+' buildout:installed-manifest=.installed.manifest'
+    ...              ' verify e'),
+    Error: Part e isn't installed.
+    """
+
+def recipe_signatures_are_cached():
+    r"""
+Parts are reinstalled when the distributions of their recipes change,
+which buildout tells from the signatures it records for them.  Parts using
+the same recipe share its signature, and with the signature-cache option,
+signatures are kept in a file between runs:
+
+    >>> mkdir('recipe')
+    >>> write('recipe', 'setup.py',
+    ... '''
+    ... from setuptools import setup
+    ... setup(name='recipe',
+    ...       entry_points={'zc.buildout': ['default = recipe:Recipe']},
+    ...       )
+    ... ''')
+    >>> write('recipe', 'recipe.py',
+    ... '''
+    ... class Recipe:
+    ...     def __init__(self, buildout, name, options):
+    ...         pass
+    ...     def install(self):
+    ...         return ()
+    ...     update = install
+    ... ''')
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a b
+    ... signature-cache = .signatures
+    ...
+    ... [a]
+    ... recipe = recipe
+    ...
+    ... [b]
+    ... recipe = recipe
+    ... ''')
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Installing a.
+    Installing b.
+
+    >>> import ConfigParser, marshal
+    >>> def get_signature(part):
+    ...     parser = ConfigParser.RawConfigParser()
+    ...     parser.read('.installed.cfg')
+    ...     return parser.get(part, '__buildout_signature__')
+    >>> cache = marshal.load(open('.signatures', 'rb'))
+    >>> cache.keys()
+    ['recipe']
+    >>> cache['recipe'][0] == get_signature('a')
+    True
+
+The cached signatures are used for as long as the distributions they were
+computed from are unchanged:
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Updating a.
+    Updating b.
+
+    >>> write('recipe', 'README.txt', 'A recipe.')
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Uninstalling b.
+    Uninstalling a.
+    Installing a.
+    Installing b.
+
+    >>> marshal.load(open('.signatures', 'rb'))['recipe'][0] == (
+    ...     get_signature('a'))
+    True
+
+A damaged cache file is ignored and written again:
+
+    >>> write('.signatures', 'garbage')
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Updating a.
+    Updating b.
+
+    >>> marshal.load(open('.signatures', 'rb'))['recipe'][0] == (
+    ...     get_signature('a'))
+    True
+    """
+
+def develop_hashes_are_cached():
+    r"""
+The signatures of develop distributions include a hash of their files.
+Given a cache, _dir_hash keeps the hashes it computes there along with the
+inodes, sizes and modification times of the files hashed:
+
+    >>> from zc.buildout.buildout import _dir_hash, _dir_hashes
+    >>> mkdir('src')
+    >>> mkdir('src', 'sub')
+    >>> write('src', 'setup.py', 'setup')
+    >>> write('src', 'sub', 'module.py', 'code')
+
+    >>> expected = _dir_hash('src')
+    >>> _dir_hashes.clear()
+    >>> cache = {}
+    >>> _dir_hash('src', cache) == expected
+    True
+    >>> cache.keys()
+    ['src']
+    >>> cache['src'][1] == expected
+    True
+
+The cached hash is used for as long as the files are unchanged:
+
+    >>> _dir_hashes.clear()
+    >>> cache['src'] = cache['src'][0], 'cached'
+    >>> _dir_hash('src', cache)
+    'cached'
+
+    >>> _dir_hashes.clear()
+    >>> write('src', 'sub', 'module.py', 'more code')
+    >>> _dir_hash('src', cache) == cache['src'][1] != 'cached'
+    True
+    >>> _dir_hashes.clear()
+    >>> _dir_hash('src') == cache['src'][1]
+    True
+    >>> _dir_hashes.clear()
+    """
+
+def plan_shows_what_install_would_do():
+    r"""
+The plan command prints what an install run would do without running any
+recipes, along with estimates of how long each step would take, based on
+the times recorded in the file named by the timing-history option:
+
+    >>> mkdir('recipe')
+    >>> write('recipe', 'setup.py',
+    ... '''
+    ... from setuptools import setup
+    ... setup(name='recipe',
+    ...       entry_points={'zc.buildout': ['default = recipe:Recipe']},
+    ...       )
+    ... ''')
+    >>> write('recipe', 'recipe.py',
+    ... '''
+    ... import os
+    ... class Recipe:
+    ...     def __init__(self, buildout, name, options):
+    ...         self.name = name
+    ...     def install(self):
+    ...         print 'Running', self.name
+    ...         open(self.name, 'w').close()
+    ...         return self.name
+    ...     update = install
+    ... ''')
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a b
+    ... timing-history = .timings
+    ...
+    ... [a]
+    ... recipe = recipe
+    ...
+    ... [b]
+    ... recipe = recipe
+    ... ''')
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Installing a.
+    Running a
+    Installing b.
+    Running b
+
+    >>> from zc.buildout.buildout import _read_timings
+    >>> timings, records = _read_timings('.timings')
+    >>> sorted(timings)
+    [(None, 'develop'), (None, 'load'), ('a', 'install'), ('b', 'install')]
+
+Let's pretend that parts took longer to install:
+
+    >>> import marshal
+    >>> f = open('.timings', 'wb')
+    >>> for (part, action, wall) in [('a', 'install', 3.0),
+    ...                              ('a', 'update', 1.0),
+    ...                              ('a', 'update', 2.0),
+    ...                              ('a', 'update', 6.0),
+    ...                              ('b', 'uninstall', 0.5)]:
+    ...     marshal.dump((part, action, dict(time=0.0, wall=wall)), f)
+    >>> f.close()
+
+    >>> print system(buildout + ' plan'),
+    Update a: 2.0s
+    Update b: no timing history
+    Estimated time: 2.0s, not counting 1 step(s).
+
+Parts whose options changed, whose recipes changed, whose installed files
+are missing or that aren't parts anymore are uninstalled first.  Recipes
+aren't run, so nothing changes until the next install run:
+
+    >>> remove('b')
+    >>> print system(buildout + ' plan'),
+    Uninstall b (installed files are missing): 0.5s
+    Update a: 2.0s
+    Install b: no timing history
+    Estimated time: 2.5s, not counting 1 step(s).
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a
+    ... timing-history = .timings
+    ...
+    ... [a]
+    ... recipe = recipe
+    ... x = 1
+    ... ''')
+    >>> print system(buildout + ' plan'),
+    Uninstall b (no longer a part): 0.5s
+    Uninstall a (options changed): no timing history
+    Install a: 3.0s
+    Estimated time: 3.5s, not counting 1 step(s).
+
+Given parts, the plan is for installing just these parts:
+
+    >>> print system(buildout + ' plan a'),
+    Uninstall a (options changed): no timing history
+    Install a: 3.0s
+    Estimated time: 3.0s, not counting 1 step(s).
+    """
+
+def stats_report_recorded_times():
+    r"""
+Install runs record the wall and CPU times taken to load the configuration,
+process develop sources, and install, update or uninstall each part, along
+with the number of files installed, in the file named by the timing-history
+option:
+
+    >>> mkdir('recipe')
+    >>> write('recipe', 'setup.py',
+    ... '''
+    ... from setuptools import setup
+    ... setup(name='recipe',
+    ...       entry_points={'zc.buildout': ['default = recipe:Recipe']},
+    ...       )
+    ... ''')
+    >>> write('recipe', 'recipe.py',
+    ... '''
+    ... import os
+    ... class Recipe:
+    ...     def __init__(self, buildout, name, options):
+    ...         self.name = name
+    ...     def install(self):
+    ...         os.mkdir(self.name)
+    ...         open(os.path.join(self.name, 'a'), 'w').close()
+    ...         open(os.path.join(self.name, 'b'), 'w').close()
+    ...         return self.name
+    ... ''')
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a
+    ... timing-history = .timings
+    ...
+    ... [a]
+    ... recipe = recipe
+    ... ''')
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Installing a.
+
+    >>> from zc.buildout.buildout import _read_timings
+    >>> timings, records = _read_timings('.timings')
+    >>> stats = timings['a', 'install'][0]
+    >>> sorted(stats)
+    ['cpu', 'files', 'time', 'wall']
+    >>> stats['files']
+    2
+
+The stats command reports on them, slowest steps first, along with the
+steps that took much longer the last time than they usually do:
+
+    >>> import marshal
+    >>> f = open('.timings', 'wb')
+    >>> for (part, action, wall) in [(None, 'load', 0.5),
+    ...                              ('a', 'install', 1.0),
+    ...                              ('a', 'install', 1.2),
+    ...                              ('a', 'install', 1.1),
+    ...                              ('a', 'install', 1.5),
+    ...                              ('a', 'install', 4.0),
+    ...                              ('a', 'uninstall', 0.2)]:
+    ...     marshal.dump((part, action, dict(time=0.0, wall=wall, cpu=0.1)),
+    ...                  f)
+    >>> f.close()
+    >>> print system(buildout + ' stats'),
+    Step                Runs  Median  Latest   CPU  Files  Trend
+    install a              5    1.2s    4.0s  0.1s         +150%
+    load configuration     1    0.5s    0.5s  0.1s
+    uninstall a            1    0.2s    0.2s  0.1s
+    <BLANKLINE>
+    Regressions:
+      install a took 4.0s, 3.5 times the median of 1.1s
+
+    >>> print system(buildout + ' stats x'),
+    No timings were recorded.
+    """
+
+def staged_updates_replace_changed_files_only():
+    r"""
+When the options of a part change, it's uninstalled and installed again.
+With the staged-update option, a part installing into the directory named
+by its location option is installed into a staging directory instead,
+whose changed files then replace the ones at the location:
+
+    >>> mkdir('recipe')
+    >>> write('recipe', 'setup.py',
+    ... '''
+    ... from setuptools import setup
+    ... setup(name='recipe',
+    ...       entry_points={'zc.buildout': ['default = recipe:Recipe']},
+    ...       )
+    ... ''')
+    >>> write('recipe', 'recipe.py',
+    ... '''
+    ... import os
+    ... class Recipe:
+    ...     def __init__(self, buildout, name, options):
+    ...         self.options = options
+    ...         options['location'] = os.path.join(
+    ...             buildout['buildout']['parts-directory'], name)
+    ...     def install(self):
+    ...         if self.options.get('fail'):
+    ...             raise ValueError('failed')
+    ...         location = self.options['location']
+    ...         os.mkdir(location)
+    ...         os.mkdir(os.path.join(location, 'lib'))
+    ...         for name in self.options['files'].split():
+    ...             f = open(os.path.join(location, 'lib', name), 'w')
+    ...             f.write(name + self.options['version'])
+    ...             f.close()
+    ...         for name in self.options.get('dirs', '').split():
+    ...             os.mkdir(os.path.join(location, 'lib', name))
+    ...             open(os.path.join(location, 'lib', name, 'x'), 'w').close()
+    ...         return location
+    ...     def update(self):
+    ...         pass
+    ... ''')
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a
+    ...
+    ... [a]
+    ... recipe = recipe
+    ... staged-update = true
+    ... files = same changed gone
+    ... version = 1
+    ... ''')
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Installing a.
+
+    >>> lib = join('parts', 'a', 'lib')
+    >>> def inode(name):
+    ...     return os.stat(join(lib, name)).st_ino
+    >>> same, changed = inode('same'), inode('changed')
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a
+    ...
+    ... [a]
+    ... recipe = recipe
+    ... staged-update = true
+    ... files = same changed new
+    ... version = 1
+    ... changed = 2
+    ... ''')
+    >>> write('recipe', 'recipe.py',
+    ...       open(join('recipe', 'recipe.py')).read().replace(
+    ...           "name + self.options['version']",
+    ...           "name + self.options.get(name, self.options['version'])"))
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Uninstalling a.
+    Installing a.
+
+    >>> ls(lib)
+    -  changed
+    -  new
+    -  same
+    >>> cat(lib, 'changed')
+    changed2
+    >>> inode('same') == same, inode('changed') == changed
+    (True, False)
+    >>> ls('parts')
+    d  a
+    d  buildout
+
+Files may be replaced by directories and directories by files:
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a
+    ...
+    ... [a]
+    ... recipe = recipe
+    ... staged-update = true
+    ... files = same
+    ... dirs = changed
+    ... version = 1
+    ... ''')
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Uninstalling a.
+    Installing a.
+    >>> ls(lib)
+    d  changed
+    -  same
+    >>> ls(lib, 'changed')
+    -  x
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a
+    ...
+    ... [a]
+    ... recipe = recipe
+    ... staged-update = true
+    ... files = same changed
+    ... version = 1
+    ... ''')
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Uninstalling a.
+    Installing a.
+    >>> ls(lib)
+    -  changed
+    -  same
+    >>> cat(lib, 'changed')
+    changed1
+    >>> ls('parts')
+    d  a
+    d  buildout
+
+If the install fails, the part is gone, as it would be without staging:
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = a
+    ...
+    ... [a]
+    ... recipe = recipe
+    ... staged-update = true
+    ... files = same
+    ... version = 1
+    ... fail = true
+    ... ''')
+    >>> print system(buildout), # doctest: +ELLIPSIS
+    Develop: '/sample-buildout/recipe'
+    Uninstalling a.
+    Installing a.
+    While:
+      Installing a.
+    <BLANKLINE>
+    An internal error occurred due to a bug in either zc.buildout or in a
+    recipe being used:
+    Traceback (most recent call last):
+    ...
+    ValueError: failed
+    >>> ls('parts')
+    d  buildout
+    """
+
+if hasattr(os, 'symlink'):
+    def staged_updates_replace_symlinks():
+        """
+Symbolic links in the location of a part installed in stages are replaced
+by files and directories too, and the other way around:
+
+    >>> from zc.buildout.buildout import _replace_tree
+    >>> mkdir('location')
+    >>> mkdir('location', 'target')
+    >>> os.symlink('target', join('location', 'dir'))
+    >>> os.symlink('target', join('location', 'file'))
+    >>> mkdir('location', 'link')
+
+    >>> mkdir('staging')
+    >>> mkdir('staging', 'dir')
+    >>> write('staging', 'dir', 'x', '')
+    >>> write('staging', 'file', '')
+    >>> os.symlink('dir', join('staging', 'link'))
+
+    >>> _replace_tree('staging', 'location')
+    >>> ls('location')
+    d  dir
+    -  file
+    d  link
+    >>> os.path.islink(join('location', 'dir'))
+    False
+    >>> ls('location', 'dir')
+    -  x
+    >>> os.readlink(join('location', 'link'))
+    'dir'
+    """
+
+def deferred_removal_of_uninstalled_directories():
+    r"""
+With the deferred-removal option, uninstalled directories are moved to
+parts/.trash, to be removed in the background while the run goes on.  The
+run waits for them to be removed before it ends:
+
+    >>> mkdir('recipe')
+    >>> write('recipe', 'setup.py',
+    ... '''
+    ... from setuptools import setup
+    ... setup(name='recipe',
+    ...       entry_points={'zc.buildout': ['default = recipe:Recipe']},
+    ...       )
+    ... ''')
+    >>> write('recipe', 'recipe.py',
+    ... '''
+    ... import os
+    ... class Recipe:
+    ...     def __init__(self, buildout, name, options):
+    ...         self.path = options['path']
+    ...     def install(self):
+    ...         os.mkdir(self.path)
+    ...         open(os.path.join(self.path, 'data'), 'w').close()
+    ...         return self.path
+    ... ''')
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = data-dir
+    ... deferred-removal = true
+    ...
+    ... [data-dir]
+    ... recipe = recipe
+    ... path = mystuff
+    ... ''')
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Installing data-dir.
+
+    >>> write('buildout.cfg',
+    ... '''
+    ... [buildout]
+    ... develop = recipe
+    ... parts = data-dir
+    ... deferred-removal = true
+    ...
+    ... [data-dir]
+    ... recipe = recipe
+    ... path = otherstuff
+    ... ''')
+
+Anything left in the trash by an earlier run, which may have been
+interrupted, is removed as well:
+
+    >>> mkdir('parts', '.trash')
+    >>> mkdir('parts', '.trash', 'leftover')
+
+    >>> print system(buildout),
+    Develop: '/sample-buildout/recipe'
+    Uninstalling data-dir.
+    Installing data-dir.
+
+    >>> os.path.exists('mystuff'), os.path.exists('otherstuff')
+    (False, True)
+    >>> os.path.exists(join('parts', '.trash'))
+    False
+    """
+
+def develop_signatures_can_ignore_files():
+    r"""
+The develop-signature-ignore option gives glob patterns for files and
+directories to leave out of the signatures of develop distributions, and
+the develop-signature-ignore-files option names ignore files, such as
+.gitignore, whose patterns apply to the directories they're found in.
+Ignored directories aren't walked at all:
+
+    >>> from zc.buildout.buildout import _walk
+    >>> def files(ignore=None):
+    ...     result = []
+    ...     for (dirpath, dirnames, filenames) in _walk('src', ignore):
+    ...         result.extend([os.path.join(dirpath, name)[4:]
+    ...                        for name in filenames])
+    ...     result.sort()
+    ...     for name in result:
+    ...         print name.replace(os.sep, '/')
+
+    >>> mkdir('src')
+    >>> mkdir('src', '.git')
+    >>> mkdir('src', 'build')
+    >>> mkdir('src', 'docs')
+    >>> write('src', 'setup.py', 'setup')
+    >>> write('src', '.git', 'HEAD', 'master')
+    >>> write('src', 'build', 'module.py', 'code')
+    >>> write('src', 'docs', 'index.txt', 'docs')
+    >>> write('src', 'docs', 'build.log', 'log')
+    >>> write('src', 'docs', 'keep.log', 'log')
+    >>> write('src', 'docs', '.gitignore', '*.log\n!keep.log\n')
+    >>> files()
+    .git/HEAD
+    build/module.py
+    docs/.gitignore
+    docs/build.log
+    docs/index.txt
+    docs/keep.log
+    setup.py
+
+    >>> files((('.git', 'build/'), ('.gitignore',)))
+    docs/.gitignore
+    docs/index.txt
+    docs/keep.log
+    setup.py
+
+A leading slash anchors a pattern to the directory it applies to, so
+directories of the same name further down are kept:
+
+    >>> mkdir('src', 'docs', 'build')
+    >>> write('src', 'docs', 'build', 'conf.py', 'conf')
+    >>> files((('/build/',), ('.gitignore',)))
+    .git/HEAD
+    docs/.gitignore
+    docs/build/conf.py
+    docs/index.txt
+    docs/keep.log
+    setup.py
+    >>> write('src', 'docs', '.gitignore', '/build\n')
+    >>> files(((), ('.gitignore',)))
+    .git/HEAD
+    build/module.py
+    docs/.gitignore
+    docs/build.log
+    docs/index.txt
+    docs/keep.log
+    setup.py
+    >>> files((('build',), ()))
+    .git/HEAD
+    docs/.gitignore
+    docs/build.log
+    docs/index.txt
+    docs/keep.log
+    setup.py
+    >>> remove('src', 'docs', 'build')
+    >>> write('src', 'docs', '.gitignore', '*.log\n!keep.log\n')
+
+.hgignore files use regular expressions unless they say otherwise:
+
+    >>> write('src', '.hgignore', '^docs/.*log$\nsyntax: glob\nbuild\n')
+    >>> files(((), ('.hgignore',)))
+    .git/HEAD
+    .hgignore
+    docs/.gitignore
+    docs/index.txt
+    setup.py
+
+The hashes of develop distributions depend on the files left out:
+
+    >>> from zc.buildout.buildout import _dir_hash, _dir_hashes
+    >>> ignore = (('.git',), ())
+    >>> hash = _dir_hash('src', None, ignore)
+    >>> hash == _dir_hash('src')
+    False
+    >>> write('src', '.git', 'HEAD', 'branch')
+    >>> _dir_hashes.clear()
+    >>> hash == _dir_hash('src', None, ignore)
+    True
+    >>> _dir_hashes.clear()
+    """
+
+def eggs_manifest_is_used_to_find_installed_distributions():
+    """
+With the eggs-manifest option, the installer keeps a manifest of the
+distributions in the eggs directory (see zc.buildout.eggmanifest) and finds
+them through it, rather than by opening the eggs.  To see which eggs are
+opened, we'll have pkg_resources.find_distributions note the ones it's
+called for:
+
+    >>> dest = tmpdir('sample-install')
+    >>> opened = []
+    >>> find_distributions = pkg_resources.find_distributions
+    >>> def noting_find_distributions(path_item, only=False):
+    ...     if path_item.startswith(dest):
+    ...         opened.append(os.path.basename(path_item))
+    ...     return find_distributions(path_item, only)
+    >>> pkg_resources.find_distributions = noting_find_distributions
+
+    >>> old_use_eggs_manifest = zc.buildout.easy_install.use_eggs_manifest(
+    ...     True)
+    >>> ws = zc.buildout.easy_install.install(
+    ...     ['demo==0.2'], dest, links=[link_server],
+    ...     index=link_server+'index/')
+    >>> sorted(map(str, ws))
+    ['demo 0.2', 'demoneeded 1.1']
+    >>> os.path.exists(join(dest, '.manifest', 'eggs'))
+    True
+
+When we install again, the distributions are found without opening the
+eggs.  Only the egg of the distribution that's used is opened, to read its
+meta data:
+
+    >>> del opened[:]
+    >>> ws = zc.buildout.easy_install.install(
+    ...     ['demoneeded'], dest, links=[link_server],
+    ...     index=link_server+'index/')
+    >>> sorted(map(str, ws))
+    ['demoneeded 1.1']
+    >>> sorted(set(opened))
+    ['demoneeded-1.1-pyN.N.egg']
+
+A distribution that's fetched is added to the manifest, so it's found
+later without opening the other eggs or scanning the directory again:
+
+    >>> del opened[:]
+    >>> ws = zc.buildout.easy_install.install(
+    ...     ['demo'], dest, links=[link_server],
+    ...     index=link_server+'index/')
+    >>> sorted(map(str, ws))
+    ['demo 0.3', 'demoneeded 1.1']
+    >>> sorted(set(opened))
+    ['demo-0.3-pyN.N.egg']
+
+    >>> del opened[:]
+    >>> sorted(map(str, zc.buildout.eggmanifest.distributions(dest)))
+    ['demo 0.2', 'demo 0.3', 'demoneeded 1.1']
+    >>> opened
+    []
+
+    >>> pkg_resources.find_distributions = find_distributions
+    >>> _ = zc.buildout.easy_install.use_eggs_manifest(old_use_eggs_manifest)
+    """
+
+def eggs_manifest_caches_meta_data():
+    """
+With the eggs-manifest option, the meta data read from eggs found through
+the manifest to resolve requirements and to generate scripts is cached in
+.manifest/metadata, so that later runs don't open the eggs at all.  As
+above, we'll note the eggs that are opened:
+
+    >>> dest = tmpdir('sample-install')
+    >>> opened = []
+    >>> find_distributions = pkg_resources.find_distributions
+    >>> def noting_find_distributions(path_item, only=False):
+    ...     if path_item.startswith(dest):
+    ...         opened.append(os.path.basename(path_item))
+    ...     return find_distributions(path_item, only)
+    >>> pkg_resources.find_distributions = noting_find_distributions
+
+    >>> old_use_eggs_manifest = zc.buildout.easy_install.use_eggs_manifest(
+    ...     True)
+    >>> bin = tmpdir('bin')
+    >>> def run():
+    ...     ws = zc.buildout.easy_install.install(
+    ...         ['demo==0.2'], dest, links=[link_server],
+    ...         index=link_server+'index/')
+    ...     print sorted(map(str, ws))
+    ...     scripts = zc.buildout.easy_install.scripts(
+    ...         ['demo'], ws, sys.executable, bin)
+    ...     print [os.path.basename(script) for script in scripts]
+    ...     # The buildout saves what was read at the end of a run.
+    ...     zc.buildout.eggmanifest.save_metadata()
+
+The distributions installed by the first run are read from the eggs.  The
+second run finds them through the manifest, so their meta data is read
+from the eggs and cached:
+
+    >>> run()
+    ['demo 0.2', 'demoneeded 1.1']
+    ['demo']
+    >>> del opened[:]
+    >>> run()
+    ['demo 0.2', 'demoneeded 1.1']
+    ['demo']
+    >>> sorted(set(opened))
+    ['demo-0.2-pyN.N.egg', 'demoneeded-1.1-pyN.N.egg']
+    >>> ls(dest, '.manifest')
+    -  eggs
+    -  metadata
+
+A later run, which we'll make forget the meta data read in this process,
+as a new process would, resolves the requirements and finds the entry
+points of the scripts without opening the eggs:
+
+    >>> zc.buildout.eggmanifest._metadata.clear()
+    >>> del opened[:]
+    >>> run()
+    ['demo 0.2', 'demoneeded 1.1']
+    ['demo']
+    >>> opened
+    []
+
+    >>> pkg_resources.find_distributions = find_distributions
+    >>> _ = zc.buildout.easy_install.use_eggs_manifest(old_use_eggs_manifest)
+    """
+
 ######################################################################
 
 def make_py_with_system_install(make_py, sample_eggs):
@@ -4161,6 +5767,9 @@ def test_suite():
                 ]),
             ),
         zc.buildout.rmtree.test_suite(),
+        zc.buildout.filehash.test_suite(),
+        zc.buildout.trash.test_suite(),
+        zc.buildout.eggmanifest.test_suite(),
         doctest.DocFileSuite(
             'windows.txt',
             setUp=zc.buildout.testing.buildoutSetUp,
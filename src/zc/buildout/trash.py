@@ -0,0 +1,138 @@
+##############################################################################
+#
+# Copyright (c) 2011 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Removing files and directories in the background
+"""
+
+import doctest
+import logging
+import os
+import Queue
+import sys
+import tempfile
+import threading
+
+from zc.buildout.rmtree import rmtree
+
+logger = logging.getLogger('zc.buildout')
+
+class Trash:
+    """A directory that paths are moved to, to be removed in a thread.
+
+    Moving a path to the trash is a rename, which is quick, and which
+    takes it out of the way at once.  The trash is emptied by a thread
+    while the program goes on.  Anything left in the trash by an earlier
+    program, which may have been interrupted, is removed too.
+
+    >>> from tempfile import mkdtemp
+    >>> d = mkdtemp()
+    >>> parts = os.path.join(d, 'parts')
+    >>> os.mkdir(parts)
+    >>> os.mkdir(os.path.join(parts, 'part'))
+    >>> open(os.path.join(parts, 'part', 'file'), 'w').write('data')
+    >>> open(os.path.join(parts, 'script'), 'w').write('data')
+
+    >>> trash = Trash(os.path.join(parts, '.trash'))
+    >>> trash.put(os.path.join(parts, 'part'))
+    True
+    >>> trash.put(os.path.join(parts, 'script'))
+    True
+    >>> os.listdir(parts)
+    ['.trash']
+
+    Paths that can't be renamed into the trash, for example because
+    they're on another file system, aren't moved:
+
+    >>> trash.put(os.path.join(parts, 'nonexistent'))
+    False
+
+    Closing the trash waits for it to be emptied and removes it:
+
+    >>> trash.close()
+    >>> os.listdir(parts)
+    []
+
+    What's left in the trash when it's opened is removed as well:
+
+    >>> os.makedirs(os.path.join(parts, '.trash', 'left', 'over'))
+    >>> Trash(os.path.join(parts, '.trash')).close()
+    >>> os.listdir(parts)
+    []
+
+    >>> rmtree(d)
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._queue = Queue.Queue()
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                self._queue.put(os.path.join(directory, name))
+        self._thread = threading.Thread(target=self._empty)
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def put(self, path):
+        """Move a path to the trash.
+
+        Returns whether the path was moved.  If it wasn't, it's up to the
+        caller to remove it.
+        """
+        if not os.path.lexists(path):
+            return False
+        try:
+            if not os.path.isdir(self.directory):
+                os.mkdir(self.directory)
+            # Each path gets a directory of its own, where it keeps its
+            # name, which helps when looking at what's left after an
+            # interruption.
+            holder = tempfile.mkdtemp(dir=self.directory)
+        except OSError:
+            return False
+        try:
+            os.rename(path, os.path.join(holder, os.path.basename(path)))
+        except OSError:
+            os.rmdir(holder)
+            return False
+        self._queue.put(holder)
+        return True
+
+    def _empty(self):
+        while True:
+            path = self._queue.get()
+            if path is None:
+                break
+            try:
+                if os.path.isdir(path) and not os.path.islink(path):
+                    rmtree(path)
+                else:
+                    os.remove(path)
+            except EnvironmentError:
+                logger.warning("Couldn't remove %r: %s", path,
+                               sys.exc_info()[1])
+
+    def close(self):
+        """Wait for the trash to be emptied, and remove it if it's empty.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            os.rmdir(self.directory)
+        except OSError:
+            pass
+
+def test_suite():
+    return doctest.DocTestSuite()
+
+if "__main__" == __name__:
+    doctest.testmod()
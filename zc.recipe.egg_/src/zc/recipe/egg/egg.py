@@ -16,7 +16,8 @@
 $Id$
 """
 
-import UserDict, logging, os, re, zipfile
+import UserDict, logging, os, re, weakref, zipfile
+import pkg_resources
 import zc.buildout
 import zc.buildout.easy_install
 
@@ -76,6 +77,16 @@ class Eggs(object):
         orig_distributions = distributions[:]
         distributions.extend(extra)
 
+        cache = _working_sets_for(self.buildout)
+        if cache is not None:
+            settings = self._working_set_settings()
+            ws = _cached_working_set(cache, settings, distributions)
+            if ws is not None:
+                logging.getLogger(self.name).debug(
+                    'Reusing the distributions resolved for %s.',
+                    repr(distributions)[1:-1])
+                return orig_distributions, ws
+
         if b_options.get('offline') == 'true':
             ws = zc.buildout.easy_install.working_set(
                 distributions, options['executable'],
@@ -100,8 +111,36 @@ class Eggs(object):
                 allow_hosts=self.allow_hosts,
                 **kw)
 
+        if cache is not None:
+            _cache_working_set(cache, settings, distributions, ws)
         return orig_distributions, ws
 
+    def _working_set_settings(self):
+        # Everything besides the requirements that the distributions
+        # resolved for a part depend on.  This includes the contents of
+        # the eggs directories, so that distributions installed by other
+        # parts are considered.
+        options = self.options
+        b_options = self.buildout['buildout']
+        allowed_eggs = self.allowed_eggs
+        if allowed_eggs is not None:
+            allowed_eggs = tuple(allowed_eggs)
+        return (
+            options['executable'],
+            options['eggs-directory'],
+            _listing(options['eggs-directory']),
+            options['develop-eggs-directory'],
+            _listing(options['develop-eggs-directory']),
+            tuple(self.links), self.index, self.allow_hosts,
+            b_options.get('offline'), b_options.get('newest'),
+            options.get('unzip'),
+            self.include_site_packages, allowed_eggs,
+            tuple(sorted(
+                zc.buildout.easy_install.default_versions().items())),
+            zc.buildout.easy_install.prefer_final(),
+            zc.buildout.easy_install.use_dependency_links(),
+            )
+
     def install(self):
         reqs, ws = self.working_set()
         return ()
@@ -109,6 +148,122 @@ class Eggs(object):
     update = install
 
 
+# Parts with the same settings often need the same distributions, or some
+# of the distributions another part needed.  The distributions resolved
+# for the parts of the running buildout are kept here, so that they're
+# resolved once.  This maps settings (see Eggs._working_set_settings) to
+# mappings from requirements to the resolved distributions, in working-set
+# order, and the requirements that selected them (see _select).
+_working_sets = {}
+_working_sets_buildout = None # A weak reference to the running buildout
+
+def _working_sets_for(buildout):
+    global _working_sets, _working_sets_buildout
+    if (_working_sets_buildout is None
+        or _working_sets_buildout() is not buildout):
+        try:
+            reference = weakref.ref(buildout)
+        except TypeError:
+            # Someone is passing us a dictionary as the buildout.
+            return None
+        _working_sets = {}
+        _working_sets_buildout = reference
+    return _working_sets
+
+def _listing(directory):
+    try:
+        return tuple(sorted(os.listdir(directory)))
+    except OSError:
+        return ()
+
+def _cached_working_set(cache, settings, distributions):
+    resolved = cache.get(settings)
+    if not resolved:
+        return None
+    key = tuple(distributions)
+    if key in resolved:
+        return _new_working_set(resolved[key][0])
+    wanted = set(key)
+    for requirements, (dists, selectors) in resolved.items():
+        if selectors is None or not wanted.issubset(requirements):
+            continue
+        selected = _select(distributions, dists)
+        if selected is None:
+            continue
+        subset, subset_selectors = selected
+        # A distribution of the superset is what the installer would
+        # choose for the subset only if the same requirement selects it.
+        for dist in subset:
+            if subset_selectors[dist.key] != selectors[dist.key]:
+                break
+        else:
+            return _new_working_set(subset)
+    return None
+
+def _cache_working_set(cache, settings, distributions, ws):
+    dists = list(ws)
+    selected = _select(distributions, dists)
+    if selected is None or len(selected[0]) != len(dists):
+        # The installer added something we can't account for, so the
+        # distributions are only reused for the same requirements.
+        selectors = None
+    else:
+        selectors = selected[1]
+    cache.setdefault(settings, {})[tuple(distributions)] = dists, selectors
+
+def _new_working_set(dists):
+    ws = pkg_resources.WorkingSet([])
+    for dist in dists:
+        ws.add(dist)
+    return ws
+
+class _Unselectable(Exception):
+    pass
+
+class _Selector(zc.buildout.easy_install.Installer):
+    """Select from distributions gotten before, the way the installer does.
+
+    Only getting distributions is overridden, so the requirements are
+    constrained and resolved by the installer's own code.
+    """
+
+    _dest = None
+    _site_packages = ()
+
+    def __init__(self, dists):
+        self._dists = dict((dist.key, dist) for dist in dists)
+        # This maps the keys of the distributions selected to the
+        # requirements that selected them.
+        self.selectors = {}
+
+    def _get_dist(self, requirement, ws, always_unzip):
+        dist = self._dists.get(requirement.key)
+        if dist is None or dist not in requirement:
+            raise _Unselectable(requirement)
+        self.selectors.setdefault(requirement.key, requirement)
+        return [dist]
+
+    def _get_required(self, req, ws):
+        return self._get_dist(req, ws, False)
+
+def _select(specs, dists):
+    """Select distributions for specs the way the installer does.
+
+    Returns the distributions selected from dists, in the order the
+    installer adds them to a working set, and a mapping from their keys
+    to the requirements that selected them, or None if dists don't
+    satisfy the requirements.
+    """
+    selector = _Selector(dists)
+    ws = pkg_resources.WorkingSet([])
+    try:
+        selector._select(specs, ws)
+    except (_Unselectable, zc.buildout.UserError, ValueError,
+            pkg_resources.ResolutionError):
+        return None
+    return list(ws), selector.selectors
+
+
 class ScriptBase(Eggs):
 
     def __init__(self, buildout, name, options):
@@ -62,6 +62,108 @@ not intended.
     >>> zc.buildout.easy_install.scripts = old_scripts
 """
 
+def working_sets_are_reused_by_parts():
+    """
+Parts that need the same distributions, or some of the distributions
+another part needed, reuse the distributions resolved for it rather than
+resolving them again.  To show this, we'll make up some distributions and
+have the installer print what it resolves:
+
+    >>> import pkg_resources
+    >>> import zc.buildout.buildout
+    >>> import zc.buildout.easy_install
+    >>> import zc.recipe.egg
+
+    >>> class Metadata:
+    ...     def __init__(self, requires):
+    ...         self.requires = requires
+    ...     def has_metadata(self, name):
+    ...         return name == 'requires.txt'
+    ...     def get_metadata_lines(self, name):
+    ...         return pkg_resources.yield_lines(self.requires)
+    >>> dists = {}
+    >>> for name, requires in [('a', 'c'), ('b', 'c\\nd'), ('c', ''),
+    ...                        ('d', '')]:
+    ...     dists[name] = pkg_resources.Distribution(
+    ...         join(sample_buildout, 'eggs', name), Metadata(requires),
+    ...         project_name=name, version='1.0')
+
+    >>> def install(specs, *args, **kw):
+    ...     print 'Resolving', ', '.join(specs)
+    ...     ws = pkg_resources.WorkingSet([])
+    ...     reqs = [pkg_resources.Requirement.parse(spec) for spec in specs]
+    ...     for req in reqs:
+    ...         ws.add(dists[req.key])
+    ...     reqs.reverse()
+    ...     while reqs:
+    ...         dist = dists[reqs.pop(0).key]
+    ...         ws.add(dist)
+    ...         reqs.extend(dist.requires()[::-1])
+    ...     return ws
+    >>> old_install = zc.buildout.easy_install.install
+    >>> zc.buildout.easy_install.install = install
+
+The distributions are kept for the buildout that's running:
+
+    >>> class Buildout:
+    ...     def __init__(self, sections):
+    ...         self.sections = sections
+    ...     def __getitem__(self, name):
+    ...         return self.sections[name]
+    >>> buildout_options = zc.buildout.buildout._unannotate_section(
+    ...     zc.buildout.buildout._buildout_default_options.copy())
+    >>> buildout_options['eggs-directory'] = join(sample_buildout, 'eggs')
+    >>> buildout_options['develop-eggs-directory'] = join(
+    ...     sample_buildout, 'develop-eggs')
+    >>> buildout = Buildout({'buildout': buildout_options})
+
+    >>> def working_set(*eggs):
+    ...     options = {'eggs': '\\n'.join(eggs)}
+    ...     reqs, ws = zc.recipe.egg.Eggs(
+    ...         buildout, 'part', options).working_set()
+    ...     print [dist.project_name for dist in ws]
+
+    >>> working_set('a', 'b')
+    Resolving a, b
+    ['a', 'b', 'd', 'c']
+    >>> working_set('a', 'b')
+    ['a', 'b', 'd', 'c']
+    >>> working_set('b')
+    ['b', 'd', 'c']
+    >>> working_set('a')
+    ['a', 'c']
+
+Other requirements are resolved:
+
+    >>> working_set('a', 'd')
+    Resolving a, d
+    ['a', 'd', 'c']
+
+After distributions are installed in the eggs directory, requirements
+are resolved again, as they may select the new distributions:
+
+    >>> write(sample_buildout, 'eggs', 'c-2.0.egg', '')
+    >>> working_set('a')
+    Resolving a
+    ['a', 'c']
+
+Distributions aren't reused for requirements that would select them
+differently than the requirements they were resolved for.  Here, ``b``
+requires ``c``, but the distribution of ``c`` was selected by a version
+requirement:
+
+    >>> working_set('c<2', 'b')
+    Resolving c<2, b
+    ['c', 'b', 'd']
+    >>> working_set('b')
+    Resolving b
+    ['b', 'd', 'c']
+    >>> working_set('c<2')
+    ['c']
+
+    >>> zc.buildout.easy_install.install = old_install
+    """
+
 def setUp(test):
     zc.buildout.tests.easy_install_SetUp(test)
     zc.buildout.testing.install_develop('zc.recipe.egg', test)